@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+import cv2
+
+
+class FrameAnalysis:
+    # Everything derived from one camera frame. Each product is computed on first
+    # use and memoized, so the preview, liveliness check and capture all share a
+    # single grayscale conversion and a single detection pass. The preview
+    # thumbnail itself is drawn by preview.PreviewRenderer into reused buffers.
+    def __init__(self, seq, frame, tracker):
+        self.seq = seq
+        self.frame = frame  # Original BGR frame, never drawn on
+        self.tracker = tracker
+        self._gray = None
+        self._faces = None
+        self._rgb = None
+        self.detected = False  # True once faces were detected on this frame rather than carried over
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def faces(self):
+        if self._faces is None:
+            detector = self.tracker.detector
+            self._faces = self.tracker.update(self.frame if detector.needs_color else self.gray)
+            self.detected = True
+        return self._faces
+
+    def reuse_faces(self, faces):
+        # Carry over detections from an earlier frame on ticks that skip detection
+        if self._faces is None:
+            self._faces = faces
+
+    def set_faces(self, faces):
+        # Detections made elsewhere for exactly this frame (see detection_worker),
+        # replacing any carried-over ones
+        self._faces = faces
+        self.detected = True
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+
+class AnalysisCache:
+    # Keeps the analyses of the last few frames, keyed by frame sequence number
+    def __init__(self, tracker, capacity=4):
+        self.tracker = tracker
+        self.capacity = capacity
+        self._entries = OrderedDict()
+
+    def get(self, seq, frame):
+        analysis = self._entries.get(seq)
+        if analysis is None:
+            analysis = FrameAnalysis(seq, frame, self.tracker)
+            self._entries[seq] = analysis
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return analysis
+
+    def find(self, seq):
+        # The analysis of frame seq if it is still cached, without creating one
+        return self._entries.get(seq)
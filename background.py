@@ -0,0 +1,199 @@
+import os
+
+import cv2
+import numpy as np
+
+from cache import cache_key
+from removebg_client import RemoveBgError, get_client
+
+# Background removal backend: 'removebg' (remote API), 'rembg' (local ONNX model)
+# or 'grabcut' (local OpenCV, no extra dependencies)
+BG_BACKEND = os.environ.get('BG_BACKEND', 'removebg')
+
+# remove.bg upload settings: longest side sent (None for full resolution), upload
+# encoding, and whether to ask for just the alpha mask instead of the cut-out image
+UPLOAD_MAX_SIDE = 640
+UPLOAD_FORMAT = 'jpg'
+JPEG_QUALITY = 90
+ALPHA_ONLY = True
+
+
+class BackgroundRemovalError(Exception):
+    pass
+
+
+def decode_bgra(data):
+    # Decode encoded image bytes into a 4-channel BGRA array
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise BackgroundRemovalError("Could not decode the returned image")
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+    if image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    return image
+
+
+def apply_alpha(image, alpha):
+    # Attach alpha, resized to image's size if needed, to a BGR image
+    height, width = image.shape[:2]
+    if alpha.shape[:2] != (height, width):
+        alpha = cv2.resize(alpha, (width, height), interpolation=cv2.INTER_LINEAR)
+    result = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    result[:, :, 3] = alpha
+    return result
+
+
+def decode_alpha(data):
+    # Decode a returned image into its alpha mask
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise BackgroundRemovalError("Could not decode the returned image")
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return image[:, :, 3]
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+class RemoveBgBackend:
+    # remove.bg web API; costs a network round trip and a credit per image.
+    # To keep uploads small the image is sent downscaled to upload_max_side and,
+    # optionally, as a JPEG; with alpha_only only the mask is requested back and
+    # it is upsampled onto the local full-resolution image.
+    name = 'removebg'
+
+    def __init__(self, client=None, size='auto', upload_max_side=UPLOAD_MAX_SIDE, upload_format=UPLOAD_FORMAT,
+                 jpeg_quality=JPEG_QUALITY, alpha_only=ALPHA_ONLY):
+        self.client = client or get_client()
+        self.size = size
+        self.upload_max_side = upload_max_side  # None uploads at full resolution
+        self.upload_format = upload_format  # 'png' or 'jpg'
+        self.jpeg_quality = jpeg_quality
+        self.alpha_only = alpha_only
+
+    def cache_params(self):
+        return {'backend': self.name, 'size': self.size, 'upload_max_side': self.upload_max_side,
+                'upload_format': self.upload_format, 'jpeg_quality': self.jpeg_quality, 'alpha_only': self.alpha_only}
+
+    def encode_upload(self, image):
+        height, width = image.shape[:2]
+        if self.upload_max_side and max(height, width) > self.upload_max_side:
+            scale = self.upload_max_side / max(height, width)
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+        if self.upload_format == 'jpg':
+            return cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])[1].tobytes()
+        return cv2.imencode('.png', image)[1].tobytes()
+
+    def remove(self, image, face_box=None):
+        params = {'size': self.size}
+        if self.alpha_only:
+            params.update(channels='alpha', format='png')
+        try:
+            data = self.client.remove_background(self.encode_upload(image), **params)
+        except RemoveBgError as e:
+            if e.status_code is None:
+                raise BackgroundRemovalError(f"Could not reach remove.bg: {e.message}")
+            raise BackgroundRemovalError(str(e))
+
+        if self.alpha_only or self.upload_max_side:
+            # Keep the local full-resolution pixels and only take the mask from the API
+            return apply_alpha(image, decode_alpha(data))
+        return decode_bgra(data)
+
+
+class RembgBackend:
+    # Local U2-Net model through the optional rembg package (pip install rembg)
+    name = 'rembg'
+
+    def __init__(self, model='u2net'):
+        try:
+            from rembg import new_session
+        except ImportError:
+            raise BackgroundRemovalError("The rembg backend needs the rembg package: pip install rembg")
+        self.model = model
+        self.session = new_session(model)
+
+    def cache_params(self):
+        return {'backend': self.name, 'model': self.model}
+
+    def remove(self, image, face_box=None):
+        from rembg import remove
+
+        return decode_bgra(remove(cv2.imencode('.png', image)[1].tobytes(), session=self.session))
+
+
+class GrabCutBackend:
+    # Local OpenCV GrabCut seeded from the face box. Runs on a copy bounded to
+    # max_side pixels so its cost stays fixed whatever the input size.
+    name = 'grabcut'
+
+    def __init__(self, max_side=400, iterations=3):
+        self.max_side = max_side
+        self.iterations = iterations
+
+    def cache_params(self):
+        return {'backend': self.name, 'max_side': self.max_side, 'iterations': self.iterations}
+
+    def remove(self, image, face_box=None):
+        height, width = image.shape[:2]
+        scale = min(1.0, self.max_side / max(height, width))
+        small = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+        sh, sw = small.shape[:2]
+
+        if face_box is not None:
+            # Head and shoulders: widen the face box and extend it to the bottom edge
+            x, y, w, h = (v * scale for v in face_box)
+            x0, y0 = max(1, int(x - 0.6 * w)), max(1, int(y - 0.6 * h))
+            x1, y1 = min(sw - 1, int(x + 1.6 * w)), sh - 1
+        else:
+            # The subject fills the crop; keep a thin border as known background
+            x0, y0 = max(1, int(sw * 0.05)), max(1, int(sh * 0.05))
+            x1, y1 = sw - x0, sh - 1
+        if x1 <= x0 or y1 <= y0:
+            raise BackgroundRemovalError("Face box is outside the image")
+
+        mask = np.zeros((sh, sw), dtype=np.uint8)
+        bgd_model = np.zeros((1, 65), dtype=np.float64)
+        fgd_model = np.zeros((1, 65), dtype=np.float64)
+        cv2.grabCut(small, mask, (x0, y0, x1 - x0, y1 - y0), bgd_model, fgd_model, self.iterations, cv2.GC_INIT_WITH_RECT)
+
+        alpha = np.where((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD), 255, 0).astype(np.uint8)
+        return apply_alpha(image, alpha)
+
+
+class CachedBackend:
+    # Wraps a backend with a ResultCache, so an input already processed with the
+    # same parameters is served from disk without calling the backend again
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+        self.name = backend.name
+
+    def cache_params(self):
+        return self.backend.cache_params()
+
+    def remove(self, image, face_box=None):
+        params = self.cache_params()
+        if face_box is not None:
+            params['face_box'] = [int(v) for v in face_box]
+        key = cache_key(image, params)
+        result = self.cache.get(key)
+        if result is None:
+            result = self.backend.remove(image, face_box)
+            self.cache.put(key, result)
+        return result
+
+
+BACKENDS = {
+    'removebg': RemoveBgBackend,
+    'rembg': RembgBackend,
+    'grabcut': GrabCutBackend,
+}
+
+
+def make_backend(name=None, **kwargs):
+    name = name or BG_BACKEND
+    if name not in BACKENDS:
+        raise BackgroundRemovalError(f"Unknown background removal backend '{name}', choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from detection import DETECTION_SCALE, DETECTOR, make_detector
+from image_files import find_images, output_names
+from pipeline import process_image
+
+PROGRESS_FILE = 'progress.jsonl'
+
+# Per-process state, set up once by init_worker
+_detector = None
+_options = None
+
+
+def load_progress(output_dir):
+    # Return the inputs already processed successfully by an earlier run
+    done = set()
+    path = os.path.join(output_dir, PROGRESS_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Line cut short by an interrupted run
+                if entry.get('status') == 'ok':
+                    done.add(entry['file'])
+    return done
+
+
+def init_worker(detector, detection_scale, output_dir):
+    # Each worker process owns its own detector (and CascadeClassifier). OpenCV's internal
+    # threading is turned off so the pool, not OpenCV, decides core usage.
+    global _detector, _options
+    cv2.setNumThreads(1)
+    _detector = make_detector(detector, scale=detection_scale)
+    _options = {'output_dir': output_dir}
+
+
+def process_file(task):
+    # Runs in a worker: crop one file and write the result under its output
+    # name, returning a progress entry
+    path, name = task
+    try:
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError("Could not read image")
+        result = process_image(image, _detector)
+        output = os.path.join(_options['output_dir'], name)
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        if not cv2.imwrite(output, result.photo):
+            raise IOError(f"Could not write {output}")
+        return {'file': path, 'status': 'ok', 'output': output, 'face_box': [int(v) for v in result.face_box]}
+    except Exception as e:
+        return {'file': path, 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+
+def run(source, output_dir, workers=None, detector=DETECTOR, detection_scale=DETECTION_SCALE, resume=True):
+    os.makedirs(output_dir, exist_ok=True)
+    paths = find_images(source)
+    # Named from the whole input set, so a resumed run gives each file the same name
+    names, clashes = output_names(paths)
+    done = load_progress(output_dir) if resume else set()
+    pending = [(p, names[p]) for p in paths if p in names and p not in done]
+    workers = workers or os.cpu_count() or 1
+    print(f"{len(paths)} images found, {len(paths) - len(pending) - len(clashes)} already done, {len(pending)} to process with {workers} workers")
+
+    ok = failed = 0
+    started = time.perf_counter()
+    with open(os.path.join(output_dir, PROGRESS_FILE), 'a' if resume else 'w') as progress, \
+            ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                initargs=(detector, detection_scale, output_dir)) as pool:
+        for path, other in clashes.items():
+            progress.write(json.dumps({'file': path, 'status': 'error', 'error': f"Same output name as {other}"}) + '\n')
+            failed += 1
+            print(f"Error: {path}: same output name as {other}")
+        chunksize = max(1, min(32, len(pending) // (workers * 4)))
+        for entry in pool.map(process_file, pending, chunksize=chunksize):
+            # Written as results arrive, so an interrupted run can resume
+            progress.write(json.dumps(entry) + '\n')
+            progress.flush()
+            if entry['status'] == 'ok':
+                ok += 1
+            else:
+                failed += 1
+                print(f"Error: {entry['file']}: {entry['error']}")
+
+    elapsed = time.perf_counter() - started
+    rate = (ok + failed) / elapsed if elapsed > 0 else 0.0
+    print(f"Processed {ok + failed} images in {elapsed:.1f}s ({rate:.1f} images/s): {ok} ok, {failed} failed")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crop a directory or glob of photos to ICAO size without the GUI")
+    parser.add_argument("source", help="Directory of images or glob pattern (quote it)")
+    parser.add_argument("output", help="Directory for the cropped photos and progress.jsonl")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--detector", default=DETECTOR, help="haar, lbp or yunet")
+    parser.add_argument("--detection-scale", type=float, default=DETECTION_SCALE)
+    parser.add_argument("--restart", action="store_true", help="Ignore progress from earlier runs")
+    args = parser.parse_args()
+
+    failed = run(args.source, args.output, args.workers, args.detector, args.detection_scale, resume=not args.restart)
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from background import RemoveBgBackend
+from detection import DETECTION_SCALE, DETECTOR, make_detector
+from frame_sources import open_source
+from icao import composite_on_background, crop_to_icao
+from pipeline import primary_face
+from preview import PreviewRenderer
+
+PREVIEW_SIZE = (450, 350)  # Live feed size in bg_removal.py
+# Synthetic frames moving a real face, so detection and cropping take the capture path
+DEFAULT_SOURCE = 'synthetic:' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'face.jpg')
+
+# Stages run on every preview tick, which together bound the live frame rate
+LIVE_STAGES = ('gray', 'detect', 'preview')
+# Stages run once per captured photo
+CAPTURE_STAGES = ('crop', 'upload_encode', 'composite', 'save')
+
+# Regressions are judged on these statistics
+COMPARED = ('p50_ms', 'p95_ms')
+MIN_DELTA_MS = 0.5  # Slowdowns smaller than this are timer noise on sub-millisecond stages
+
+
+class StageTimer:
+    # Collects per-call latencies for each named stage
+    def __init__(self):
+        self.samples = {}
+
+    def time(self, stage, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.samples.setdefault(stage, []).append(time.perf_counter() - started)
+        return result
+
+    def summary(self):
+        stats = {}
+        for stage, samples in self.samples.items():
+            ms = np.array(samples) * 1000
+            stats[stage] = {
+                'count': len(samples),
+                'mean_ms': float(ms.mean()),
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p95_ms': float(np.percentile(ms, 95)),
+                'p99_ms': float(np.percentile(ms, 99)),
+            }
+        return stats
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def fallback_face(frame):
+    # A centred box of typical face size, so capture stages are timed even on
+    # frames where nothing was detected
+    height, width = frame.shape[:2]
+    size = height // 3
+    return (width - size) // 2, (height - size) // 3, size, size
+
+
+def run(source, frames=300, warmup=10, detector=None, detection_scale=DETECTION_SCALE):
+    # Drive the real pipeline code headless over frames from source. Every frame
+    # goes through the live stages and, like a capture, through the capture
+    # stages. Alpha for the composite comes from a fixed ellipse so no remote
+    # call is made.
+    face_detector = make_detector(detector, scale=detection_scale)
+    renderer = PreviewRenderer(PREVIEW_SIZE)
+    uploader = RemoveBgBackend(client=object())  # Only its encoder is used
+    timer = StageTimer()
+    output_dir = tempfile.mkdtemp(prefix='benchmark-')
+    output_path = os.path.join(output_dir, 'photo.png')
+    alpha = None
+
+    processed = with_faces = 0
+    live_seconds = 0.0
+    started = time.perf_counter()
+    try:
+        while processed < frames + warmup:
+            ret, frame = source.read()
+            if not ret:
+                break
+            if processed == warmup:
+                # Warm-up frames fill caches and lazy allocations; drop their timings
+                timer.samples.clear()
+                with_faces = 0
+                live_seconds = 0.0
+                started = time.perf_counter()
+
+            live_started = time.perf_counter()
+            gray = timer.time('gray', cv2.cvtColor, frame, cv2.COLOR_BGR2GRAY)
+            faces = timer.time('detect', face_detector.detect, frame if face_detector.needs_color else gray)
+            timer.time('preview', renderer.draw, frame, faces)
+            live_seconds += time.perf_counter() - live_started
+
+            with_faces += 1 if faces else 0
+            face_box = primary_face(faces) if faces else fallback_face(frame)
+            photo = timer.time('crop', crop_to_icao, frame, face_box)
+            timer.time('upload_encode', uploader.encode_upload, photo)
+            if alpha is None:
+                alpha = np.zeros(photo.shape[:2], np.uint8)
+                height, width = alpha.shape
+                cv2.ellipse(alpha, (width // 2, height // 2), (width // 3, height // 2), 0, 0, 360, 255, -1)
+            final = timer.time('composite', composite_on_background, np.dstack([photo, alpha]))
+            timer.time('save', cv2.imwrite, output_path, final)
+            processed += 1
+    finally:
+        source.release()
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        os.rmdir(output_dir)
+
+    measured = max(0, processed - warmup)
+    elapsed = time.perf_counter() - started
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'detector': face_detector.name,
+        'detection_scale': detection_scale,
+        'frames': measured,
+        'frames_with_face': with_faces,
+        'stages': timer.summary(),
+        # Frame rate of the live stages alone, and of the whole loop including capture work
+        'live_fps': measured / live_seconds if live_seconds else 0.0,
+        'pipeline_fps': measured / elapsed if elapsed and measured else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare(result, baseline, tolerance, min_delta_ms=MIN_DELTA_MS):
+    # Regressions of result against baseline: stage latencies above
+    # (1 + tolerance) times the baseline (and by at least min_delta_ms), or a
+    # live frame rate below (1 - tolerance) times it
+    regressions = []
+    for stage, stats in baseline['stages'].items():
+        current = result['stages'].get(stage)
+        if current is None:
+            continue
+        for key in COMPARED:
+            if current[key] > stats[key] * (1 + tolerance) and current[key] - stats[key] >= min_delta_ms:
+                regressions.append(f"{stage} {key}: {current[key]:.2f} vs {stats[key]:.2f} baseline")
+    if result['live_fps'] < baseline['live_fps'] * (1 - tolerance):
+        regressions.append(f"live_fps: {result['live_fps']:.1f} vs {baseline['live_fps']:.1f} baseline")
+    return regressions
+
+
+def print_report(result):
+    print(f"{result['frames']} frames ({result['frames_with_face']} with a face), "
+          f"detector {result['detector']} at scale {result['detection_scale']}")
+    print(f"{'stage':<15}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage in LIVE_STAGES + CAPTURE_STAGES:
+        stats = result['stages'].get(stage)
+        if stats:
+            print(f"{stage:<15}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+    print(f"Live FPS: {result['live_fps']:.1f}, pipeline FPS: {result['pipeline_fps']:.1f}, "
+          f"peak RSS: {result['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each pipeline stage headless on recorded or synthetic frames")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="Frame source spec, e.g. synthetic:face.png or replay:dir")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to measure")
+    parser.add_argument("--warmup", type=int, default=10, help="Frames run before measuring")
+    parser.add_argument("--detector", default=DETECTOR)
+    parser.add_argument("--detection-scale", type=float, default=DETECTION_SCALE)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    # Replays run as fast as possible so timings don't include pacing sleeps
+    result = run(open_source(args.source, realtime=False, record_dir=''), args.frames, args.warmup,
+                 args.detector, args.detection_scale)
+    print_report(result)
+    if result['frames'] and result['frames_with_face'] == 0:
+        print("Warning: no face was detected on any frame, so detection timed empty scans and every "
+              "crop used a fallback box; use a source with a face, e.g. synthetic:fixtures/face.jpg", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        raise SystemExit(1 if regressions else 0)
@@ -0,0 +1,93 @@
+import time
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+
+from pipeline import primary_face
+
+ROI_WIDTH = 96  # Face region is scored at this width, so cost doesn't grow with face size
+TARGET_FACE_HEIGHT = 0.4  # Preferred face box height as a fraction of the frame height
+
+# Weights of each quality term in the combined score
+WEIGHTS = {'sharpness': 0.4, 'exposure': 0.2, 'size': 0.15, 'centering': 0.15, 'symmetry': 0.1}
+
+FrameScore = namedtuple('FrameScore', ['sharpness', 'exposure', 'size', 'centering', 'symmetry'])
+_Entry = namedtuple('_Entry', ['timestamp', 'analysis', 'score'])
+
+
+def score_frame(gray, face_box):
+    # Cheap quality terms for one frame. Every term but sharpness is in [0, 1];
+    # sharpness is a raw Laplacian variance, normalised later against the
+    # other frames in the buffer.
+    frame_height, frame_width = gray.shape[:2]
+    x, y, w, h = face_box
+    roi = gray[max(0, y):y + h, max(0, x):x + w]
+    if roi.size == 0:
+        return None
+    roi = cv2.resize(roi, (ROI_WIDTH, max(1, round(ROI_WIDTH * roi.shape[0] / roi.shape[1]))), interpolation=cv2.INTER_AREA)
+
+    # Motion blur and defocus flatten the Laplacian response
+    sharpness = cv2.Laplacian(roi, cv2.CV_32F).var()
+
+    # Penalise clipped shadows/highlights and a mean far from mid-grey
+    hist = cv2.calcHist([roi], [0], None, [256], [0, 256]).ravel()
+    hist /= hist.sum()
+    clipped = hist[:8].sum() + hist[248:].sum()
+    mean = float(np.dot(hist, np.arange(256)))
+    exposure = max(0.0, 1.0 - clipped * 4) * (1.0 - abs(mean - 128) / 128)
+
+    size = max(0.0, 1.0 - abs(h / frame_height - TARGET_FACE_HEIGHT) / TARGET_FACE_HEIGHT)
+
+    dx = (x + w / 2 - frame_width / 2) / (frame_width / 2)
+    dy = (y + h / 2 - frame_height / 2) / (frame_height / 2)
+    centering = max(0.0, 1.0 - (dx * dx + dy * dy) ** 0.5)
+
+    # A frontal face is roughly mirror-symmetric; a turned head is not
+    half = roi.shape[1] // 2
+    left = roi[:, :half].astype(np.int16)
+    right = roi[:, -half:][:, ::-1].astype(np.int16)
+    symmetry = 1.0 - float(np.abs(left - right).mean()) / 255
+
+    return FrameScore(sharpness, exposure, size, centering, symmetry)
+
+
+class FrameRing:
+    # Rolling buffer of the last capacity frames that had a face, each scored
+    # once when it is added. best() picks the highest scoring frame of the
+    # last window seconds. Only frames detected on themselves are taken: boxes
+    # carried over from an earlier frame would crop and score the wrong region.
+    def __init__(self, capacity=30, window=1.0):
+        self.capacity = capacity
+        self.window = window
+        self._entries = deque(maxlen=capacity)
+
+    def clear(self):
+        self._entries.clear()
+
+    def add(self, analysis, timestamp=None):
+        if not analysis.detected:
+            return None
+        faces = analysis.faces
+        if len(faces) == 0:
+            return None
+        if self._entries and self._entries[-1].analysis.seq == analysis.seq:
+            return self._entries[-1].score
+        score = score_frame(analysis.gray, primary_face(faces))
+        if score is not None:
+            self._entries.append(_Entry(time.monotonic() if timestamp is None else timestamp, analysis, score))
+        return score
+
+    def best(self, now=None):
+        # Analysis of the best frame in the window, or None if there is none
+        now = time.monotonic() if now is None else now
+        candidates = [e for e in self._entries if now - e.timestamp <= self.window]
+        if not candidates:
+            return None
+        sharpest = max(e.score.sharpness for e in candidates) or 1.0
+
+        def combined(entry):
+            score = entry.score._replace(sharpness=entry.score.sharpness / sharpest)
+            return sum(WEIGHTS[name] * value for name, value in score._asdict().items())
+
+        return max(candidates, key=combined).analysis
@@ -1,19 +1,26 @@
-import cv2
+from startup import StartupTrace
+
+startup_trace = StartupTrace()  # Started first so it covers the imports below
+
 import tkinter as tk
 from tkinter import Label, Button, filedialog, Frame, messagebox
-from PIL import Image, ImageTk
-import io
-import requests
+import queue
+import threading
 import time
+from concurrent.futures import Future
+from camera import FrameGrabber, negotiate_modes
+from liveliness import LivelinessCheck
+from metrics import metrics, overlay_text, start_exporters
+from scheduler import FrameScheduler
+
+# OpenCV, NumPy, PIL and requests are imported on the startup thread (see
+# load_backend) or on first use, so the window can appear before they load.
 
-# Constants for ICAO passport size (35mm x 45mm) at 600 DPI
-ICAO_WIDTH_PX = 827
-ICAO_HEIGHT_PX = 1063
 BOX_WIDTH = 450
 BOX_HEIGHT = 350
-
-# Haar Cascade for face detection
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+BG_TIMEOUT = 90  # Seconds before a background removal is abandoned
+STILL_TIMEOUT = 3.0  # Seconds to wait for a full-resolution still before cropping the preview frame
+OVERLAY_KEY = '<F12>'  # Toggles the metrics overlay on the live feed
 
 class PassportPhotoApp:
     def __init__(self, window):
@@ -61,179 +68,521 @@ class PassportPhotoApp:
         self.account_button = Button(self.button_frame, text="Account Limit", font=("Arial", 12), command=self.check_account_limit, bg="#FF9800", fg="white", width=15, height=1)
         self.account_button.pack(pady=10)
 
+        # Credit balance, kept current from the cached account state without extra API calls
+        self.credits_label = Label(self.button_frame, text="Credits: ...", font=("Arial", 10), bg="white")
+        self.credits_label.pack(pady=5)
+
         # Control buttons for right side (below captured image)
         self.remove_bg_button = Button(self.right_frame, text="Remove BG", font=("Arial", 12), command=self.remove_background, state='disabled', bg="#FF5722", fg="white", width=15, height=1)
         self.remove_bg_button.pack(pady=10)
 
+        self.cancel_bg_button = Button(self.right_frame, text="Cancel", font=("Arial", 12), command=self.cancel_background, state='disabled', bg="#9E9E9E", fg="white", width=15, height=1)
+        self.cancel_bg_button.pack(pady=10)
+
+        # Progress of the background removal running on the worker thread
+        self.bg_status_label = Label(self.right_frame, text="", font=("Arial", 10), bg="white")
+        self.bg_status_label.pack(pady=5)
+
         self.save_button = Button(self.right_frame, text="Save Photo", font=("Arial", 12), command=self.save_photo, state='disabled', bg="#2196F3", fg="white", width=15, height=1)
         self.save_button.pack(pady=10)
 
         self.retake_button = Button(self.right_frame, text="Retake Photo", font=("Arial", 12), command=self.retake_photo, state='disabled', bg="#f44336", fg="white", width=15, height=1)
         self.retake_button.pack(pady=10)
 
-        self.video_capture = cv2.VideoCapture(0)
-        self.check_liveliness()  # Start the liveliness detection
-        self.display_frame()
+        # Everything below is set up by load_backend on the startup thread
+        self.video_capture = None
+        self.frame_grabber = None
+        self.face_tracker = None
+        self.detection_worker = None  # Set when detection runs in its own process
+        self.worker_seq = None  # Frame seq of the newest detection worker result
+        self.worker_faces = []
+        self.bg_backend = None
+        self.credit_tracker = None
+        self.frame_seq = 0  # Sequence number of the last frame shown in the live feed
+        self.analysis = None  # Analysis of the frame currently shown in the live feed
+        self.label_camera.imgtk = None
+        self.scheduler = FrameScheduler()
+        self.liveliness = LivelinessCheck()
+        self.bg_job = None  # Future of the background removal in progress
+        self.bg_job_id = 0  # Bumped on cancel/retake so late results are discarded
+        self.bg_job_started = None
 
         self.photo = None  # Placeholder for the captured photo
+        self.photo_final = None  # Captured photo composited onto the ICAO background, once removed
+        self.photo_face_box = None  # Face box in photo coordinates, seeds local backends such as GrabCut
         self.face_image = None  # Placeholder for the extracted face
 
+        # Debug overlay with hot-path timings; opening it turns metrics collection on
+        self.overlay_label = Label(self.left_frame, text="", font=("Courier", 8), justify="left", anchor="nw", bg="#000000", fg="#00FF00")
+        self.overlay_visible = False
+        self.window.bind(OVERLAY_KEY, self.toggle_overlay)
+
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.account_button.config(state='disabled')
+        self.instruction_label.config(text="Starting camera...")
+        self.window.after_idle(startup_trace.mark, 'window shown')
+
+        # Open the camera and load the detector and HTTP client without blocking the window
+        self.startup_queue = queue.Queue()
+        threading.Thread(target=self.load_backend, name="Startup", daemon=True).start()
+        self.window.after(20, self.poll_startup)
+
+    def load_backend(self):
+        # Runs on the startup thread; nothing here may touch Tk widgets
+        try:
+            import cv2  # noqa: F401
+            startup_trace.mark('cv2 imported')
+            from detection import FaceTracker, make_detector
+            from analysis import AnalysisCache
+            from best_shot import FrameRing
+            from background import BG_BACKEND, CachedBackend, make_backend
+            from cache import ResultCache
+            from frame_sources import open_source
+            from detection_worker import DETECTION_PROCESS, DetectionWorker, worker_frame_shape
+            # Loaded here too so the first capture doesn't pay for them on the Tk thread
+            import icao, pipeline, preview  # noqa: F401
+            startup_trace.mark('modules imported')
+
+            # Face detector selected by detection.DETECTOR, run on a downscaled frame (see detection.DETECTION_SCALE)
+            face_tracker = FaceTracker(make_detector())  # Shared by the preview, liveliness check and capture
+            startup_trace.mark('detector loaded')
+
+            # The webcam by default; a file, recording or synthetic source when FRAME_SOURCE says so
+            video_capture = open_source()
+            startup_trace.mark('camera opened')
+            # Stream a small MJPG preview and keep the largest mode for stills; a no-op for non-camera sources
+            preview_size, still_size, fourcc = negotiate_modes(video_capture)
+            if preview_size is not None:
+                print(f"Camera: preview {preview_size[0]}x{preview_size[1]} {fourcc}, "
+                      f"stills {'%dx%d' % still_size if still_size else 'from the preview stream'}")
+            frame_grabber = FrameGrabber(video_capture, preview_size, still_size).start()
+            startup_trace.mark('camera modes negotiated')
+
+            # Optionally detect in a separate process, fed through a shared-memory frame ring
+            # with slots big enough for the negotiated preview
+            detection_worker = None
+            if DETECTION_PROCESS:
+                detection_worker = DetectionWorker(max_shape=worker_frame_shape(preview_size)).start()
+                if detection_worker.wait_ready(timeout=10):
+                    startup_trace.mark('detection worker ready')
+                else:
+                    print("Detection worker did not start; detecting in-process")
+                    detection_worker.stop()
+                    detection_worker = None
+
+            # Selected by background.BG_BACKEND; repeat inputs are served from the on-disk cache
+            bg_backend = CachedBackend(make_backend(), ResultCache())
+            startup_trace.mark('background backend loaded')
+
+            # Only remove.bg has an account to show; local backends never call it
+            credit_tracker = None
+            if BG_BACKEND == 'removebg':
+                from removebg_client import get_client
+                from credits import CreditTracker
+                credit_tracker = CreditTracker(get_client())
+                startup_trace.mark('http client ready')
+        except Exception as e:
+            self.startup_queue.put(('error', e))
+            return
+
+        self.startup_queue.put(('ready', {
+            'video_capture': video_capture,
+            'frame_grabber': frame_grabber,
+            'face_tracker': face_tracker,
+            'detection_worker': detection_worker,
+            'analysis_cache': AnalysisCache(face_tracker),
+            'frame_ring': FrameRing(),  # Recent frames with a face, scored for best-shot capture
+            'bg_backend': bg_backend,
+            'credit_tracker': credit_tracker,
+        }))
+
+    def poll_startup(self):
+        try:
+            status, result = self.startup_queue.get_nowait()
+        except queue.Empty:
+            self.window.after(20, self.poll_startup)
+            return
+
+        if status == 'error':
+            self.instruction_label.config(text="Could not start the camera.")
+            messagebox.showerror("Error", f"Startup failed: {result}")
+            return
+
+        for name, value in result.items():
+            setattr(self, name, value)
+        from preview import PreviewRenderer
+        self.preview_renderer = PreviewRenderer((BOX_WIDTH, BOX_HEIGHT))
+        start_exporters()  # JSON-lines dump and /metrics endpoint, when configured
+        if self.credit_tracker is not None:
+            self.account_button.config(state='normal')
+            self.update_credit_display()
+        else:
+            self.account_button.pack_forget()
+            self.credits_label.pack_forget()
+        self.check_liveliness()  # Start the liveliness detection
+        self.display_frame()
+        startup_trace.mark('ready')
+        startup_trace.report()
+
     def display_frame(self):
-        # Read the frame from the webcam
-        ret, frame = self.video_capture.read()
-        if ret:
-            # Convert the frame to grayscale for face detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # Detect faces in the image
-            faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(150, 150))
-
-            # Draw rectangles around detected faces
-            for (x, y, w, h) in faces:
-                cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
-
-            # Convert the frame to RGB
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            # Convert to PIL Image for display
-            frame_pil = Image.fromarray(frame_rgb)
-            frame_pil = frame_pil.resize((BOX_WIDTH, BOX_HEIGHT))  # Resize for display in the window
-            frame_tk = ImageTk.PhotoImage(image=frame_pil)
-            self.label_camera.imgtk = frame_tk
-            self.label_camera.configure(image=frame_tk)
-
-        # Repeat after 10 ms to keep the video feed running
-        self.window.after(10, self.display_frame)
+        started = time.perf_counter()
+        # Take the latest frame from the grabber thread, skipping work if nothing new arrived
+        seq, frame = self.frame_grabber.read()
+        if frame is not None and seq != self.frame_seq:
+            self.frame_seq = seq
+            self.scheduler.frame_shown(seq)
+            # Analyse the frame once; capture_photo reuses this exact analysis
+            previous = self.analysis
+            self.analysis = self.analysis_cache.get(seq, frame)
+
+            if self.detection_worker is not None and not self.detection_worker.alive:
+                print("Detection worker exited; detecting in-process")
+                self.detection_worker.stop()
+                self.detection_worker = None
+
+            # Frames too large for the worker's ring (e.g. a 4K video source) are detected in-process
+            use_worker = self.detection_worker is not None and self.detection_worker.fits(frame)
+            if use_worker:
+                # Detection runs in the worker process; show the newest boxes it has sent back
+                self.detection_worker.submit(seq, frame)
+                self.apply_worker_result()
+                self.analysis.reuse_faces(self.worker_faces)
+            # Otherwise detect at the cadence the scheduler can afford and keep the last boxes in between
+            elif previous is None or self.scheduler.detection_due():
+                detection_started = time.perf_counter()
+                faces = self.analysis.faces
+                detection_seconds = time.perf_counter() - detection_started
+                self.scheduler.record_detection(detection_seconds)
+                metrics.observe('detection_seconds', detection_seconds)
+            else:
+                self.analysis.reuse_faces(previous.faces)
+
+            # Reuse this frame's detections for the liveliness check
+            self.update_liveliness(self.analysis.faces)
+
+            # Score the frame so capture can pick the best of the last second. Frames
+            # showing carried-over boxes are skipped by the ring; with the worker, frames
+            # are added when their result arrives (see apply_worker_result).
+            self.frame_ring.add(self.analysis)
+
+            # Resized preview with the detected faces outlined, pasted into a persistent PhotoImage
+            frame_tk = self.preview_renderer.render(self.analysis.frame, self.analysis.faces)
+            if self.label_camera.imgtk is not frame_tk:
+                self.label_camera.imgtk = frame_tk
+                self.label_camera.configure(image=frame_tk)
+            metrics.inc('frames_shown_total')
+        else:
+            self.update_liveliness()
+
+        if metrics.enabled:
+            metrics.observe('display_frame_seconds', time.perf_counter() - started)
+            metrics.gauge('preview_fps', self.scheduler.achieved_fps)
+            metrics.gauge('camera_fps', self.scheduler.camera_fps)
+            metrics.gauge('frames_dropped', self.scheduler.frames_dropped)
+            metrics.gauge('grabber_dropped_frames', self.frame_grabber.dropped_frames)
+            metrics.gauge('detection_every', self.scheduler.detection_every)
+
+        # Schedule the next tick based on measured costs and the camera's frame rate
+        self.window.after(self.scheduler.end_tick(started), self.display_frame)
+
+    def apply_worker_result(self):
+        result = self.detection_worker.poll()
+        if result is None or result[0] == self.worker_seq:
+            return
+        self.worker_seq, self.worker_faces = result
+        metrics.observe('detection_seconds', self.detection_worker.detection_seconds)
+        detected = self.analysis_cache.find(self.worker_seq)
+        if detected is not None:
+            detected.set_faces(self.worker_faces)
+            self.frame_ring.add(detected)
 
     def check_liveliness(self):
-        self.instruction_label.config(text="Please move your head up and down for 5 seconds...")
-        self.capture_button.config(state='disabled')
-        start_time = time.time()
-        vertical_movement_detected = False
-        
-        while time.time() - start_time < 5:
-            ret, frame = self.video_capture.read()
-            if ret:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(150, 150))
-
-                if len(faces) > 0:
-                    # Indicate vertical movement detection
-                    self.instruction_label.config(text="Great! Now move your head left and right for 5 seconds...")
-                    vertical_movement_detected = True
-                    break
-
-        if vertical_movement_detected:
-            start_time = time.time()  # Reset timer for left-right movement
-            while time.time() - start_time < 5:
-                ret, frame = self.video_capture.read()
-                if ret:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(150, 150))
-
-                    if len(faces) > 0:
-                        # Indicate successful liveliness detection
-                        self.instruction_label.config(text="Liveliness check complete! You may capture your photo.")
-                        self.capture_button.config(state='normal')  # Enable capture button
-                        return
-
-        # If no movement detected or time exceeded
-        self.instruction_label.config(text="Liveliness check failed! Please try again.")
+        # Restart the liveliness check; display_frame advances it one frame per tick
+        self.liveliness.restart()
+        self.instruction_label.config(text=self.liveliness.instruction)
         self.capture_button.config(state='disabled')
 
+    def update_liveliness(self, faces=None):
+        # Advance the liveliness check with the detections of the frame just shown
+        if self.liveliness.done:
+            return
+        phase = self.liveliness.phase
+        if faces is None:
+            self.liveliness.tick()
+        else:
+            self.liveliness.update(faces)
+
+        if self.liveliness.phase != phase:
+            self.instruction_label.config(text=self.liveliness.instruction)
+            if self.liveliness.passed:
+                self.capture_button.config(state='normal')  # Enable capture button
+
     def capture_photo(self):
-        # Capture the current frame
-        ret, frame = self.video_capture.read()
-        if ret:
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        from pipeline import primary_face
 
-            # Detect faces in the image
-            faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(150, 150))
+        started = time.perf_counter()
+        if self.frame_grabber.still_size is not None:
+            # Take a full-resolution still and crop it around the face in the newest preview frame
+            analysis = self.analysis
+        else:
+            # Crop the sharpest, best exposed frame of the last second, reusing its detections
+            analysis = self.frame_ring.best() or self.analysis
+        if analysis is None:
+            return
+        if len(analysis.faces) == 0:
+            messagebox.showerror("Error", "No face detected! Please try again.")
+            return
 
-            if len(faces) == 0:
-                messagebox.showerror("Error", "No face detected! Please try again.")
-                return
+        # A removal still running for the previous photo no longer applies
+        self.discard_background_job("")
+        face_box = primary_face(analysis.faces)
+        if self.frame_grabber.still_size is None:
+            self.show_capture(analysis.frame, face_box, started)
+            return
 
-            # Assuming the first detected face is the one to capture
-            (x, y, w, h) = faces[0]
-            face_img = frame[y:y + h, x:x + w]
+        self.capture_button.config(state='disabled')
+        self.instruction_label.config(text="Hold still...")
+        still = self.frame_grabber.request_still()
+        self.window.after(20, self.poll_still, still, analysis.frame, face_box, started)
 
-            # Resize the face image to ICAO size
-            face_img_resized = cv2.resize(face_img, (ICAO_WIDTH_PX, ICAO_HEIGHT_PX))
-            self.photo = face_img_resized  # Save the captured photo
+    def poll_still(self, still, preview_frame, face_box, started):
+        from pipeline import refine_face, scale_box
 
-            # Show the captured image in the right preview frame
-            img_pil = Image.fromarray(cv2.cvtColor(face_img_resized, cv2.COLOR_BGR2RGB))
-            img_tk = ImageTk.PhotoImage(image=img_pil)
-            self.label_captured.imgtk = img_tk
-            self.label_captured.configure(image=img_tk)
+        if not still.done() and time.perf_counter() - started < STILL_TIMEOUT:
+            self.window.after(20, self.poll_still, still, preview_frame, face_box, started)
+            return
+        self.instruction_label.config(text=self.liveliness.instruction)
+        if not self.liveliness.passed:
+            still.cancel()
+            return  # Retaken while the still was on its way
+        self.capture_button.config(state='normal')
+
+        frame = None
+        if still.done() and not still.cancelled() and still.exception() is None:
+            frame = still.result()
+        else:
+            still.cancel()
+        if frame is None:
+            # No still in time; fall back to the preview frame the face was found in
+            print("Still capture failed; using the preview frame")
+            self.show_capture(preview_frame, face_box, started)
+            return
 
-            # Enable buttons
-            self.remove_bg_button.config(state='normal')
-            self.save_button.config(state='normal')
-            self.retake_button.config(state='normal')
+        # Map the preview box onto the still and re-detect around it in case the head moved
+        face_box = scale_box(face_box, preview_frame.shape, frame.shape)
+        face_box = refine_face(frame, face_box, self.face_tracker.detector)
+        self.show_capture(frame, face_box, started)
+
+    def show_capture(self, frame, face_box, started):
+        import cv2
+        from PIL import Image, ImageTk
+        from icao import crop_to_icao, face_box_in_crop
+
+        # Crop around the face with ICAO head proportions
+        face_img_resized = crop_to_icao(frame, face_box)
+        self.photo = face_img_resized  # Save the captured photo
+        self.photo_face_box = face_box_in_crop(face_box, (face_img_resized.shape[1], face_img_resized.shape[0]))
+        self.photo_final = None
+
+        # Show the captured image in the right preview frame
+        img_pil = Image.fromarray(cv2.cvtColor(face_img_resized, cv2.COLOR_BGR2RGB))
+        img_tk = ImageTk.PhotoImage(image=img_pil)
+        self.label_captured.imgtk = img_tk
+        self.label_captured.configure(image=img_tk)
+
+        # Enable buttons
+        self.remove_bg_button.config(state='normal')
+        self.save_button.config(state='normal')
+        self.retake_button.config(state='normal')
+        metrics.observe('capture_photo_seconds', time.perf_counter() - started)
 
     def remove_background(self):
         if self.photo is None:
             messagebox.showerror("Error", "No photo to remove background from!")
             return
+        if self.bg_job is not None:
+            return  # Already running
 
-        # Call remove.bg API to remove background
-        api_key = 'INSERT_YOUR_API_KEY_HERE'  # Replace with your actual API key
-        url = 'https://api.remove.bg/v1.0/removebg'
-        files = {'image_file': cv2.imencode('.png', self.photo)[1].tobytes()}
-        headers = {'X-Api-Key': api_key}
+        # Run the backend on the worker thread and poll for the result from Tk
+        self.bg_job_id += 1
+        self.bg_job = self.start_background_job(self.photo.copy(), self.photo_face_box)
+        self.bg_job_started = time.monotonic()
+        self.remove_bg_button.config(state='disabled')
+        self.cancel_bg_button.config(state='normal')
+        self.bg_status_label.config(text="Removing background...")
+        metrics.gauge('background_jobs', 1)
+        self.window.after(50, self.poll_background, self.bg_job_id)
+
+    def start_background_job(self, photo, face_box=None):
+        # Each removal gets its own daemon thread. A cancelled or timed-out job
+        # can't be interrupted mid-request, but it no longer holds up the next
+        # one (or app exit) while it runs out its HTTP timeouts.
+        job = Future()
+
+        def run():
+            if not job.set_running_or_notify_cancel():
+                return
+            try:
+                job.set_result(self.replace_background(photo, face_box))
+            except BaseException as e:
+                job.set_exception(e)
+
+        threading.Thread(target=run, name="BackgroundRemoval", daemon=True).start()
+        return job
+
+    def replace_background(self, photo, face_box=None):
+        # Runs on the worker thread: cut out the subject and put it on the ICAO background
+        from icao import composite_on_background
+        return composite_on_background(self.bg_backend.remove(photo, face_box))
+
+    def poll_background(self, job_id):
+        import cv2
+        from PIL import Image, ImageTk
+        from background import BackgroundRemovalError
+
+        if job_id != self.bg_job_id:
+            return  # Cancelled or superseded by a retake
+
+        elapsed = time.monotonic() - self.bg_job_started
+        if not self.bg_job.done():
+            if elapsed > BG_TIMEOUT:
+                metrics.inc('background_removals_total', labels={'result': 'timeout'})
+                self.discard_background_job("Background removal timed out.")
+                return
+            self.bg_status_label.config(text=f"Removing background... {elapsed:.0f}s")
+            self.window.after(50, self.poll_background, job_id)
+            return
 
-        response = requests.post(url, files=files, headers=headers)
+        job = self.bg_job
+        self.discard_background_job("")
+        metrics.observe('background_removal_seconds', elapsed)
+        try:
+            self.photo_final = job.result()
+        except BackgroundRemovalError as e:
+            metrics.inc('background_removals_total', labels={'result': 'failed'})
+            self.bg_status_label.config(text="Background removal failed.")
+            messagebox.showerror("Error", str(e))
+            return
+        except Exception as e:
+            metrics.inc('background_removals_total', labels={'result': 'failed'})
+            self.bg_status_label.config(text="Background removal failed.")
+            messagebox.showerror("Error", f"Background removal failed: {e}")
+            return
 
-        if response.status_code == requests.codes.ok:
-            # Show the image with the background removed
-            img_no_bg = Image.open(io.BytesIO(response.content))
-            img_no_bg_tk = ImageTk.PhotoImage(img_no_bg)
-            self.label_captured.imgtk = img_no_bg_tk
-            self.label_captured.configure(image=img_no_bg_tk)
-        else:
-            messagebox.showerror("Error", f"Error: {response.status_code}, {response.text}")
+        metrics.inc('background_removals_total', labels={'result': 'ok'})
+        # Show the photo on its new background
+        self.bg_status_label.config(text=f"Background removed in {elapsed:.1f}s")
+        img_no_bg_tk = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(self.photo_final, cv2.COLOR_BGR2RGB)))
+        self.label_captured.imgtk = img_no_bg_tk
+        self.label_captured.configure(image=img_no_bg_tk)
+
+    def cancel_background(self):
+        if self.bg_job is not None:
+            metrics.inc('background_removals_total', labels={'result': 'cancelled'})
+        self.discard_background_job("Background removal cancelled.")
+
+    def discard_background_job(self, status):
+        # Forget the running job; a result that still arrives is ignored
+        if self.bg_job is not None:
+            self.bg_job.cancel()
+            self.bg_job = None
+            self.bg_job_id += 1
+            self.bg_status_label.config(text=status)
+            metrics.gauge('background_jobs', 0)
+        self.cancel_bg_button.config(state='disabled')
+        self.remove_bg_button.config(state='normal' if self.photo is not None else 'disabled')
 
     def save_photo(self):
+        import cv2
+
         if self.photo is None:
             messagebox.showerror("Error", "No photo to save!")
             return
 
         file_path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png"), ("All files", "*.*")])
         if file_path:
-            cv2.imwrite(file_path, self.photo)
+            # Save the version with the background replaced when there is one
+            cv2.imwrite(file_path, self.photo_final if self.photo_final is not None else self.photo)
             messagebox.showinfo("Success", "Photo saved successfully!")
 
     def retake_photo(self):
         self.photo = None  # Clear the captured photo
+        self.photo_final = None
+        self.photo_face_box = None
+        self.discard_background_job("")
         self.label_captured.configure(image='')  # Clear the displayed image
         self.remove_bg_button.config(state='disabled')
         self.save_button.config(state='disabled')
         self.retake_button.config(state='disabled')
         self.check_liveliness()  # Restart liveliness detection
 
+    def update_credit_display(self):
+        # Refresh the balance label from the tracker; it only calls the API once its cache expires
+        balance = self.credit_tracker.balance()
+        if balance is not None:
+            self.credits_label.config(text=f"Credits: {balance:g}")
+        elif self.credit_tracker.last_error is not None:
+            self.credits_label.config(text="Credits: unavailable")
+        self.window.after(1000, self.update_credit_display)
+
     def check_account_limit(self):
-        api_key = 'INSERT_YOUR_API_KEY_HERE'  # Replace with your actual API key
-        url = 'https://api.remove.bg/v1.0/account'
-        headers = {'X-Api-Key': api_key}
-
-        response = requests.get(url, headers=headers)
-
-        if response.status_code == 200:
-            data = response.json()
-            credits = data['data']['attributes']['credits']
-            balance_msg = f"Total Credits: {credits['total']}\nSubscription Credits: {credits['subscription']}\nPay-As-You-Go Credits: {credits['payg']}\nEnterprise Credits: {credits['enterprise']}\nFree API Calls: {data['data']['attributes']['api']['free_calls']}"
-            messagebox.showinfo("Account Limit", balance_msg)
-        elif response.status_code == 403:
-            messagebox.showerror("Error", "Authentication failed! Check your API key.")
-        elif response.status_code == 429:
-            messagebox.showerror("Error", "Rate limit exceeded!")
+        from removebg_client import RemoveBgError
+
+        attributes, charged = self.credit_tracker.snapshot()
+        error = self.credit_tracker.last_error
+        if attributes is None:
+            if error is None or self.credit_tracker.refreshing:
+                messagebox.showinfo("Account Limit", "Fetching account details, please try again in a moment.")
+            elif isinstance(error, RemoveBgError) and error.status_code == 403:
+                messagebox.showerror("Error", "Authentication failed! Check your API key.")
+            elif isinstance(error, RemoveBgError) and error.status_code == 429:
+                messagebox.showerror("Error", "Rate limit exceeded!")
+            elif isinstance(error, RemoveBgError):
+                messagebox.showerror("Error", f"An error occurred: {error.status_code}")
+            else:
+                messagebox.showerror("Error", f"An error occurred: {error}")
+            if error is not None:
+                self.credit_tracker.refresh_async(force=True)  # Try again for the next click
+            return
+
+        credits = attributes['credits']
+        balance_msg = f"Total Credits: {credits['total'] - charged:g}\nSubscription Credits: {credits['subscription']}\nPay-As-You-Go Credits: {credits['payg']}\nEnterprise Credits: {credits['enterprise']}\nFree API Calls: {attributes['api']['free_calls']}"
+        messagebox.showinfo("Account Limit", balance_msg)
+
+    def toggle_overlay(self, event=None):
+        self.overlay_visible = not self.overlay_visible
+        if self.overlay_visible:
+            metrics.enabled = True
+            self.overlay_label.place(x=4, y=4)
+            self.update_overlay()
         else:
-            messagebox.showerror("Error", f"An error occurred: {response.status_code}")
+            self.overlay_label.place_forget()
+
+    def update_overlay(self):
+        if not self.overlay_visible:
+            return
+        self.overlay_label.config(text=overlay_text())
+        self.overlay_label.lift()
+        self.window.after(500, self.update_overlay)
+
+    def release_camera(self):
+        if self.frame_grabber is not None:
+            self.frame_grabber.stop()
+        if self.video_capture is not None:
+            self.video_capture.release()
+
+    def on_close(self):
+        print(self.scheduler.summary())
+        if self.face_tracker is not None:
+            print(self.face_tracker.report())
+        if self.detection_worker is not None:
+            print(self.detection_worker.report())
+            self.detection_worker.stop()
+        self.release_camera()
+        self.window.destroy()
 
     def __del__(self):
-        self.video_capture.release()
+        self.release_camera()
 
 if __name__ == "__main__":
     root = tk.Tk()
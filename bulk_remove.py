@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from background import BG_BACKEND, BackgroundRemovalError, CachedBackend, make_backend
+from cache import ResultCache
+from credits import CreditTracker
+from icao import is_icao_shaped, nominal_face_box
+from image_files import find_images, output_names
+from metrics import metrics, start_exporters
+from removebg_client import RemoveBgClient
+
+FAILED_FILE = 'failed.jsonl'
+_STOP = object()  # Queue sentinel telling a worker to exit
+
+
+class RateLimiter:
+    # Token bucket allowing rate_per_minute acquisitions per minute with bursts
+    # up to burst. When a client is given, an exhausted X-RateLimit-Remaining also
+    # makes callers wait until the window resets.
+    def __init__(self, rate_per_minute, burst=None, client=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1, int(self.rate))
+        self.client = client
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = self._server_wait()
+                if wait <= 0 and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                if wait <= 0:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def _server_wait(self):
+        if self.client is None or self.client.rate_limit_remaining != 0 or self.client.rate_limit_reset is None:
+            return 0
+        return max(0, self.client.rate_limit_reset - time.time())
+
+
+class BulkRemover:
+    # Feeds image paths through a bounded queue to concurrency worker threads,
+    # each calling the backend within the rate limit. Results are written under
+    # their output names (see image_files.output_names) as they arrive and
+    # failures are appended to failed.jsonl for a later retry.
+    def __init__(self, backend, output_dir, concurrency=4, rate_per_minute=500, tracker=None, limiter=None):
+        self.backend = backend
+        self.output_dir = output_dir
+        self.concurrency = concurrency
+        self.tracker = tracker
+        self.limiter = limiter or RateLimiter(rate_per_minute)
+        self.done = 0
+        self.failed = 0
+        self.out_of_credits = False
+        self._lock = threading.Lock()
+        self._failed_file = None
+
+    def output_path(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def _record_failure(self, path, error, name=None):
+        with self._lock:
+            self.failed += 1
+            self._failed_file.write(json.dumps({'file': path, 'output': name, 'error': error}) + '\n')
+            self._failed_file.flush()
+        print(f"Error: {path}: {error}")
+
+    def _process(self, path, name):
+        image = cv2.imread(path)
+        if image is None:
+            self._record_failure(path, "Could not read image", name)
+            return
+        # Crops made by crop_to_icao have the face at a known place, which seeds GrabCut
+        face_box = nominal_face_box((image.shape[1], image.shape[0])) if is_icao_shaped(image) else None
+        self.limiter.acquire()
+        try:
+            result = self.backend.remove(image, face_box)
+        except BackgroundRemovalError as e:
+            self._record_failure(path, str(e), name)
+            return
+        except Exception as e:
+            self._record_failure(path, f"{type(e).__name__}: {e}", name)
+            return
+        output = self.output_path(name)
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        if not cv2.imwrite(output, result):
+            self._record_failure(path, f"Could not write {output}", name)
+            return
+        with self._lock:
+            self.done += 1
+
+    def _worker(self, jobs):
+        while True:
+            job = jobs.get()
+            if job is _STOP:
+                return
+            self._process(*job)
+
+    def run(self, paths, names=None, clashes=None, report_every=5.0):
+        # names maps each path to its output name and clashes lists inputs left
+        # without one; both default to output_names(paths)
+        if names is None:
+            names, clashes = output_names(paths)
+        os.makedirs(self.output_dir, exist_ok=True)
+        jobs = queue.Queue(maxsize=self.concurrency * 2)
+        workers = [threading.Thread(target=self._worker, args=(jobs,), daemon=True) for _ in range(self.concurrency)]
+        started = last_report = time.perf_counter()
+
+        with open(os.path.join(self.output_dir, FAILED_FILE), 'a') as failed_file:
+            self._failed_file = failed_file
+            for worker in workers:
+                worker.start()
+            for path, other in (clashes or {}).items():
+                self._record_failure(path, f"Same output name as {other}")
+            for path in paths:
+                if path not in names:
+                    continue
+                # Stop queueing before the account runs dry; in-flight requests still finish
+                if self.tracker is not None and not self.tracker.can_afford(self.concurrency):
+                    self.out_of_credits = True
+                    print("Stopping: not enough remove.bg credits left")
+                    break
+                jobs.put((path, names[path]))
+                metrics.gauge('bulk_queue_depth', jobs.qsize())
+                now = time.perf_counter()
+                if now - last_report >= report_every:
+                    last_report = now
+                    print(self.progress(now - started))
+            for _ in workers:
+                jobs.put(_STOP)
+            for worker in workers:
+                worker.join()
+
+        print(self.progress(time.perf_counter() - started))
+        return self.failed
+
+    def progress(self, elapsed):
+        rate = (self.done + self.failed) / elapsed if elapsed > 0 else 0.0
+        return f"{self.done} done, {self.failed} failed in {elapsed:.1f}s ({rate:.2f} images/s)"
+
+
+def load_failed(output_dir):
+    # Return the inputs listed in failed.jsonl, mapped to their output names, and
+    # start a fresh failure list. Inputs that failed for want of an output name
+    # stay out until they are renamed.
+    path = os.path.join(output_dir, FAILED_FILE)
+    if not os.path.exists(path):
+        return {}
+    names = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                if 'output' not in entry:
+                    # Written before output names kept subdirectories
+                    names[entry['file']] = os.path.splitext(os.path.basename(entry['file']))[0] + '.png'
+                elif entry['output'] is not None:
+                    names[entry['file']] = entry['output']
+    os.replace(path, path + '.previous')
+    return names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove backgrounds from a directory or glob of crops")
+    parser.add_argument("source", nargs='?', help="Directory of images or glob pattern (quote it)")
+    parser.add_argument("output", help="Directory for the results and failed.jsonl")
+    parser.add_argument("--backend", default=BG_BACKEND, help="removebg, rembg or grabcut")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--rate", type=float, default=500, help="Maximum requests per minute")
+    parser.add_argument("--retry-failed", action="store_true", help="Only reprocess the files in failed.jsonl")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the on-disk result cache")
+    args = parser.parse_args()
+
+    start_exporters()  # METRICS_DUMP / METRICS_PORT, when set
+    tracker = limiter = None
+    if args.backend == 'removebg':
+        # One pooled connection per request in flight, so keep-alive survives higher concurrency
+        client = RemoveBgClient(pool_size=args.concurrency)
+        backend = make_backend(args.backend, client=client)
+    else:
+        backend = make_backend(args.backend)
+    if not args.no_cache:
+        backend = CachedBackend(backend, ResultCache())
+
+    if args.backend == 'removebg':
+        tracker = CreditTracker(client)
+        tracker.refresh()
+        limiter = RateLimiter(args.rate, client=client)
+
+    clashes = {}
+    if args.retry_failed:
+        names = load_failed(args.output)
+        paths = sorted(names)
+    elif args.source:
+        # Results already written by an earlier run are skipped
+        names, clashes = output_names(find_images(args.source))
+        paths = [p for p, name in names.items() if not os.path.exists(os.path.join(args.output, name))]
+    else:
+        parser.error("source is required unless --retry-failed is given")
+
+    print(f"{len(paths)} images to process with {args.concurrency} requests in flight")
+    remover = BulkRemover(backend, args.output, args.concurrency, args.rate, tracker, limiter)
+    failed = remover.run(paths, names, clashes)
+    raise SystemExit(1 if failed or remover.out_of_credits else 0)
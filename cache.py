@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+CACHE_DIR = os.environ.get('BG_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'id-pro-photo', 'bg'))
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+
+def cache_key(image, params):
+    # Content address of an input image plus the parameters that shape the result.
+    # The raw pixels are hashed rather than an encoded PNG: it identifies the same
+    # content without paying for an encode on every lookup.
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(str((image.shape, image.dtype.str)).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    # On-disk cache of processed images stored as PNG files named by their key.
+    # File modification times record last use; when the total size exceeds
+    # max_bytes the least recently used files are deleted.
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith('.png'))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.png')
+
+    def get(self, key):
+        path = self._path(key)
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED) if os.path.exists(path) else None
+        with self._lock:
+            if image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass  # Evicted by another thread meanwhile; the image is already loaded
+        return image
+
+    def put(self, key, image):
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        ok, data = cv2.imencode('.png', image)
+        if not ok:
+            return
+        with open(temp_path, 'wb') as f:
+            f.write(data.tobytes())
+
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(temp_path, path)  # Atomic, so readers never see a partial file
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted((e for e in os.scandir(self.directory) if e.name.endswith('.png')), key=lambda e: e.stat().st_mtime)
+        for entry in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self._size -= size
@@ -0,0 +1,157 @@
+import threading
+import time
+from concurrent.futures import Future
+
+# cv2 is imported inside the mode functions: the app imports FrameGrabber
+# before its window exists, and OpenCV loads later on the startup thread
+
+# Small stream for the live preview and detection; stills use the largest mode found
+PREVIEW_SIZE = (640, 480)
+STILL_SIZES = [(3840, 2160), (2592, 1944), (1920, 1080), (1600, 1200), (1280, 720)]  # Tried largest first
+PREFERRED_FOURCC = 'MJPG'  # Compressed over USB, so large modes still run at a usable frame rate
+STILL_WARMUP_FRAMES = 3  # Frames discarded after a mode switch while exposure and buffers settle
+
+
+def fourcc_name(value):
+    value = int(value)
+    return ''.join(chr((value >> 8 * i) & 0xFF) for i in range(4))
+
+
+def set_mode(capture, size, fourcc=PREFERRED_FOURCC):
+    # Ask the camera for size (and fourcc, if it supports it) and return the size it actually chose
+    import cv2
+
+    if fourcc:
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    capture.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+    capture.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+    return int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+
+def negotiate_modes(capture, preview_size=PREVIEW_SIZE, still_sizes=STILL_SIZES, fourcc=PREFERRED_FOURCC):
+    # Probe the camera once and leave it streaming the preview mode. Returns
+    # (preview size, still size, fourcc in use); the still size is None when
+    # the camera has nothing larger than the preview, or can't switch modes.
+    import cv2
+
+    if not hasattr(capture, 'set') or not capture.isOpened():
+        return None, None, None
+    # Modes with the preview's aspect ratio come first: they usually show the same
+    # field of view, so a face box maps onto the still by plain scaling
+    aspect = preview_size[0] / preview_size[1]
+    preview_area = preview_size[0] * preview_size[1]
+    still_size = fallback = None
+    for size in sorted(still_sizes, key=lambda s: (abs(s[0] / s[1] - aspect) < 0.01, s[0] * s[1]), reverse=True):
+        if size[0] * size[1] <= preview_area:
+            continue
+        # Drivers round unsupported sizes to a nearby mode, so judge what comes back
+        actual = set_mode(capture, size, fourcc)
+        if actual[0] * actual[1] <= preview_area:
+            continue
+        if abs(actual[0] / actual[1] - aspect) < 0.01:
+            still_size = actual
+            break
+        if fallback is None or actual[0] * actual[1] > fallback[0] * fallback[1]:
+            fallback = actual  # Larger but a different shape; used if nothing matches
+    still_size = still_size or fallback
+    preview_size = set_mode(capture, preview_size, fourcc)
+    if still_size is not None and still_size[0] * still_size[1] <= preview_size[0] * preview_size[1]:
+        still_size = None
+    return preview_size, still_size, fourcc_name(capture.get(cv2.CAP_PROP_FOURCC))
+
+
+class FrameGrabber:
+    # Reads frames from a cv2.VideoCapture on a background thread and keeps only
+    # the most recent one, so the Tk event loop never blocks on read(). With a
+    # still_size it can also switch the camera to that mode for one still (see
+    # request_still) and back to preview_size.
+    def __init__(self, video_capture, preview_size=None, still_size=None):
+        self.video_capture = video_capture
+        self.preview_size = preview_size
+        self.still_size = still_size  # None when stills come from the preview stream
+        self._still_requests = []
+        self._lock = threading.Lock()
+        self._frame = None
+        self._seq = 0  # Sequence number of the latest frame (0 means no frame yet)
+        self._dropped = 0  # Frames overwritten before anyone read them
+        self._last_read_seq = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        with self._lock:
+            requests, self._still_requests = self._still_requests, []
+        for future in requests:
+            future.cancel()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def _run(self):
+        while self._running:
+            if self._still_requests:
+                self._capture_still()
+            ret, frame = self.video_capture.read()
+            if not ret:
+                # Camera not ready or unplugged; back off instead of spinning
+                time.sleep(0.01)
+                continue
+
+            with self._lock:
+                # Only the latest frame is kept, older unread frames are dropped
+                if self._seq > self._last_read_seq:
+                    self._dropped += 1
+                self._frame = frame
+                self._seq += 1
+
+    def request_still(self):
+        # Return a Future for a frame at still_size, taken on the grabber thread
+        # between preview frames. The preview pauses while the mode is switched.
+        future = Future()
+        with self._lock:
+            self._still_requests.append(future)
+        return future
+
+    def _capture_still(self):
+        with self._lock:
+            requests, self._still_requests = self._still_requests, []
+        requests = [future for future in requests if future.set_running_or_notify_cancel()]
+        if not requests:
+            return
+        switch = self.still_size is not None and self.still_size != self.preview_size
+        try:
+            if switch:
+                set_mode(self.video_capture, self.still_size)
+                for _ in range(STILL_WARMUP_FRAMES):
+                    self.video_capture.read()
+            ret, frame = self.video_capture.read()
+        except Exception as e:
+            ret, frame = False, e
+        finally:
+            if switch:
+                set_mode(self.video_capture, self.preview_size)
+        for future in requests:
+            if ret:
+                future.set_result(frame)
+            else:
+                future.set_exception(frame if isinstance(frame, Exception) else RuntimeError("Camera returned no still"))
+
+    def read(self):
+        # Return (seq, frame) for the latest frame without blocking; frame is None
+        # until the camera has delivered its first frame
+        with self._lock:
+            self._last_read_seq = self._seq
+            return self._seq, self._frame
+
+    @property
+    def dropped_frames(self):
+        return self._dropped
@@ -0,0 +1,82 @@
+import threading
+import time
+
+
+class CreditTracker:
+    # Cached view of the remove.bg account. The account is fetched at most once
+    # per ttl seconds, on a background thread, and in between the balance is
+    # kept current by subtracting the X-Credits-Charged of every removebg call
+    # made through the client.
+    def __init__(self, client, ttl=300, error_retry=30):
+        self.client = client
+        self.ttl = ttl
+        self.error_retry = error_retry  # Seconds to wait before retrying a failed fetch
+        self._lock = threading.Lock()
+        self._attributes = None  # Last /account attributes
+        self._fetched_at = None
+        self._failed_at = None
+        self._charged = 0.0  # Credits charged since the last fetch
+        self._refreshing = False
+        self.last_error = None  # Exception from the last fetch, normally a RemoveBgError
+        client.add_credit_listener(self._on_credits_charged)
+
+    def _on_credits_charged(self, amount):
+        with self._lock:
+            self._charged += amount
+
+    @property
+    def stale(self):
+        now = time.monotonic()
+        if self._failed_at is not None and now - self._failed_at < self.error_retry:
+            return False
+        return self._fetched_at is None or now - self._fetched_at > self.ttl
+
+    def refresh(self):
+        # Fetch the account now, on the calling thread
+        try:
+            attributes = self.client.account()
+        except Exception as e:
+            # RemoveBgError normally; anything else must not leave _refreshing stuck either
+            with self._lock:
+                self.last_error = e
+                self._failed_at = time.monotonic()
+            return
+        finally:
+            with self._lock:
+                self._refreshing = False
+        with self._lock:
+            self._attributes = attributes
+            self._fetched_at = time.monotonic()
+            self._charged = 0.0
+            self._failed_at = None
+            self.last_error = None
+
+    def refresh_async(self, force=False):
+        # Start a background fetch if the cached state is stale (or force is set)
+        with self._lock:
+            if self._refreshing or not (force or self.stale):
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name="CreditTracker", daemon=True).start()
+
+    @property
+    def refreshing(self):
+        return self._refreshing
+
+    def snapshot(self):
+        # Return (attributes, credits charged since they were fetched), refreshing
+        # in the background when stale. attributes is None until the first fetch.
+        self.refresh_async()
+        with self._lock:
+            return self._attributes, self._charged
+
+    def balance(self):
+        # Estimated total credits left, or None if the account was never fetched
+        attributes, charged = self.snapshot()
+        if attributes is None:
+            return None
+        return attributes['credits']['total'] - charged
+
+    def can_afford(self, credits=1):
+        balance = self.balance()
+        return balance is None or balance >= credits
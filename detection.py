@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+
+import cv2
+
+from image_files import find_images
+
+# Detection parameters used throughout the app, expressed at full frame resolution
+SCALE_FACTOR = 1.1
+MIN_NEIGHBORS = 5
+MIN_SIZE = (150, 150)
+
+# Fraction of the full resolution the cascade runs at. Lower is faster but may
+# miss small faces or shift boxes by a few pixels: 1.0 = full, 0.5 = half, 0.25 = quarter.
+DETECTION_SCALE = 0.5
+
+
+# Face detector backend: 'haar', 'lbp' (faster cascade) or 'yunet' (OpenCV DNN)
+DETECTOR = os.environ.get('FACE_DETECTOR', 'haar')
+
+# Model files that are not shipped with every OpenCV build. The LBP cascade is in
+# OpenCV's data/lbpcascades; YuNet is face_detection_yunet_2023mar.onnx from the
+# OpenCV model zoo.
+LBP_CASCADE_PATH = os.environ.get('LBP_CASCADE_PATH', 'lbpcascade_frontalface_improved.xml')
+YUNET_MODEL_PATH = os.environ.get('YUNET_MODEL_PATH', 'face_detection_yunet_2023mar.onnx')
+
+# One detected face: box is (x, y, w, h), confidence is backend specific (cascade
+# level weight or DNN score) and landmarks is a list of (x, y) points or None
+Detection = namedtuple('Detection', ['box', 'confidence', 'landmarks'])
+
+
+def load_face_cascade(kind='haar'):
+    if kind == 'lbp':
+        path = LBP_CASCADE_PATH
+        if not os.path.exists(path):
+            # Some OpenCV installs keep lbpcascades next to haarcascades
+            path = os.path.join(os.path.dirname(os.path.normpath(cv2.data.haarcascades)), 'lbpcascades', path)
+    else:
+        path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+    cascade = cv2.CascadeClassifier(path)
+    if cascade.empty():
+        raise FileNotFoundError(f"Could not load face cascade {path}")
+    return cascade
+
+
+class _ScaledDetector:
+    # Shared front-end: runs the backend on a downscaled copy of the image and
+    # maps boxes and landmarks back to full-frame coordinates. Subclasses
+    # implement _detect_small(small, min_size).
+    name = None
+    needs_color = False  # True if detect() wants the BGR frame rather than gray
+
+    def __init__(self, scale=DETECTION_SCALE, min_size=MIN_SIZE):
+        if not 0 < scale <= 1:
+            raise ValueError(f"Detection scale must be in (0, 1], got {scale}")
+        self.scale = scale
+        self.min_size = min_size
+
+    def detect_full(self, image):
+        # Return a list of Detection in the coordinates of image
+        if self.scale == 1:
+            small = image
+        else:
+            height, width = image.shape[:2]
+            size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+            small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+        min_size = (max(1, round(self.min_size[0] * self.scale)), max(1, round(self.min_size[1] * self.scale)))
+        inverse = 1.0 / self.scale
+        detections = []
+        for box, confidence, landmarks in self._detect_small(small, min_size):
+            box = tuple(int(round(v * inverse)) for v in box)
+            if landmarks is not None:
+                landmarks = [(px * inverse, py * inverse) for px, py in landmarks]
+            detections.append(Detection(box, confidence, landmarks))
+        return detections
+
+    def detect(self, image):
+        # Return a list of (x, y, w, h) boxes in the coordinates of image
+        return [detection.box for detection in self.detect_full(image)]
+
+
+class FaceDetector(_ScaledDetector):
+    # Haar or LBP cascade on the grayscale frame
+    def __init__(self, cascade, scale=DETECTION_SCALE, scale_factor=SCALE_FACTOR,
+                 min_neighbors=MIN_NEIGHBORS, min_size=MIN_SIZE, name='haar'):
+        super().__init__(scale, min_size)
+        self.cascade = cascade
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.name = name
+
+    def _detect_small(self, small, min_size):
+        faces, _, weights = self.cascade.detectMultiScale3(small, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                                           minSize=min_size, outputRejectLevels=True)
+        return [(face, float(weight), None) for face, weight in zip(faces, weights)]
+
+
+class YuNetDetector(_ScaledDetector):
+    # OpenCV's YuNet CNN face detector on the BGR frame; also returns five
+    # landmarks per face (eyes, nose tip, mouth corners)
+    name = 'yunet'
+    needs_color = True
+
+    def __init__(self, model_path=YUNET_MODEL_PATH, scale=DETECTION_SCALE, min_size=MIN_SIZE, score_threshold=0.7):
+        super().__init__(scale, min_size)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"YuNet model not found: {model_path}")
+        self.model = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold)
+
+    def _detect_small(self, small, min_size):
+        self.model.setInputSize((small.shape[1], small.shape[0]))
+        _, faces = self.model.detect(small)
+        if faces is None:
+            return []
+        detections = []
+        for face in faces:
+            x, y, w, h = face[:4]
+            if w < min_size[0] or h < min_size[1]:
+                continue
+            landmarks = [(float(face[i]), float(face[i + 1])) for i in range(4, 14, 2)]
+            detections.append(((x, y, w, h), float(face[14]), landmarks))
+        return detections
+
+
+def make_detector(name=None, scale=DETECTION_SCALE):
+    name = name or DETECTOR
+    if name in ('haar', 'lbp'):
+        return FaceDetector(load_face_cascade(name), scale=scale, name=name)
+    if name == 'yunet':
+        return YuNetDetector(scale=scale)
+    raise ValueError(f"Unknown face detector '{name}', choose from haar, lbp, yunet")
+
+
+def detector_input(detector, frame, gray=None):
+    # The image a detector expects: the BGR frame or its grayscale version
+    if detector.needs_color:
+        return frame
+    return gray if gray is not None else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+class FaceTracker:
+    # Detect-then-track: runs a full-frame detection only every redetect_interval
+    # frames or when the face is lost, and in between searches a padded region
+    # around the last box, which is far cheaper than scanning the whole frame.
+    REASONS = ('no_face', 'interval', 'lost')
+
+    def __init__(self, detector, redetect_interval=15, roi_padding=0.5):
+        self.detector = detector
+        self.redetect_interval = redetect_interval
+        self.roi_padding = roi_padding  # Padding around the last box, as a fraction of its size
+        self.last_box = None
+        self.frames_since_detect = 0
+        self.frames = 0
+        self.tracked = 0  # Frames served by the region search
+        self.redetections = dict.fromkeys(self.REASONS, 0)  # Full detections by reason
+
+    def update(self, gray):
+        # Return the faces in gray (the BGR frame for detectors that need color),
+        # reusing the previous box where possible
+        self.frames += 1
+        if self.last_box is None:
+            return self._detect_full(gray, 'no_face')
+        if self.frames_since_detect >= self.redetect_interval:
+            return self._detect_full(gray, 'interval')
+
+        box = self._search_roi(gray)
+        if box is None:
+            return self._detect_full(gray, 'lost')
+        self.tracked += 1
+        self.frames_since_detect += 1
+        self.last_box = box
+        return [box]
+
+    def _detect_full(self, gray, reason):
+        self.redetections[reason] += 1
+        self.frames_since_detect = 0
+        faces = self.detector.detect(gray)
+        # Track the largest face, which is the person standing at the kiosk
+        self.last_box = max(faces, key=lambda f: f[2] * f[3]) if len(faces) > 0 else None
+        return faces
+
+    def _search_roi(self, gray):
+        x, y, w, h = self.last_box
+        pad_x = int(w * self.roi_padding)
+        pad_y = int(h * self.roi_padding)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(gray.shape[1], x + w + pad_x), min(gray.shape[0], y + h + pad_y)
+        if x1 <= x0 or y1 <= y0:
+            return None
+
+        faces = self.detector.detect(gray[y0:y1, x0:x1])
+        if len(faces) == 0:
+            return None
+        # Prefer the box closest to where the face was on the previous frame
+        cx, cy = x + w / 2, y + h / 2
+        fx, fy, fw, fh = min(faces, key=lambda f: (x0 + f[0] + f[2] / 2 - cx) ** 2 + (y0 + f[1] + f[3] / 2 - cy) ** 2)
+        return (x0 + fx, y0 + fy, fw, fh)
+
+    def report(self):
+        full = sum(self.redetections.values())
+        rate = full / self.frames if self.frames else 0.0
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in self.redetections.items())
+        return f"Face tracker: {self.frames} frames, {full} full detections ({rate:.1%}), {self.tracked} tracked; {reasons}"
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def compare_scales(paths, scale, name=None):
+    # Compare downscaled detection against full resolution on stored frames.
+    # Returns (frames, full-resolution boxes, matched boxes, mean IoU of matches).
+    full = make_detector(name, scale=1.0)
+    scaled = make_detector(name, scale=scale)
+    frames = reference_boxes = matched = 0
+    ious = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        frames += 1
+        candidates = scaled.detect(detector_input(scaled, image, gray))
+        for box in full.detect(detector_input(full, image, gray)):
+            reference_boxes += 1
+            best = max((box_iou(box, other) for other in candidates), default=0.0)
+            if best >= 0.5:
+                matched += 1
+                ious.append(best)
+    mean_iou = sum(ious) / len(ious) if ious else 0.0
+    return frames, reference_boxes, matched, mean_iou
+
+
+def benchmark(paths, detector, labels=None):
+    # Latency and recall of one detector on a local image set. With labels
+    # ({file name: [[x, y, w, h], ...]}) a face counts as found at IoU >= 0.5;
+    # without, every image is assumed to hold one face.
+    latencies = []
+    expected = found = 0
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        started = time.perf_counter()
+        detections = detector.detect_full(detector_input(detector, image, gray))
+        latencies.append(time.perf_counter() - started)
+
+        boxes = [d.box for d in detections]
+        if labels is None:
+            expected += 1
+            found += 1 if boxes else 0
+        else:
+            for truth in labels.get(os.path.basename(path), []):
+                expected += 1
+                found += 1 if any(box_iou(truth, box) >= 0.5 for box in boxes) else 0
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+    return {
+        'detector': detector.name,
+        'images': len(latencies),
+        'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'recall': found / expected if expected else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face detection tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compare = commands.add_parser("compare", help="Check downscaled detection against full resolution")
+    compare.add_argument("frames", help="Directory or glob of stored frames")
+    compare.add_argument("--scale", type=float, default=DETECTION_SCALE)
+    compare.add_argument("--detector", default=DETECTOR)
+
+    bench = commands.add_parser("bench", help="Compare detector latency and recall on local images")
+    bench.add_argument("images", help="Directory or glob of images")
+    bench.add_argument("--detectors", default="haar,lbp,yunet", help="Comma-separated backends")
+    bench.add_argument("--scale", type=float, default=DETECTION_SCALE)
+    bench.add_argument("--labels", help="JSON file mapping image file names to face boxes")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        frames, reference_boxes, matched, mean_iou = compare_scales(find_images(args.frames), args.scale, args.detector)
+        recall = matched / reference_boxes if reference_boxes else 0.0
+        print(f"Frames: {frames}")
+        print(f"Full-resolution faces: {reference_boxes}")
+        print(f"Matched at scale {args.scale}: {matched} ({recall:.1%}), mean IoU {mean_iou:.3f}")
+    else:
+        labels = None
+        if args.labels:
+            with open(args.labels) as f:
+                labels = json.load(f)
+        paths = find_images(args.images)
+        print(f"{'detector':<10}{'images':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'recall':>9}")
+        for name in args.detectors.split(","):
+            try:
+                detector = make_detector(name.strip(), scale=args.scale)
+            except (FileNotFoundError, ValueError) as e:
+                print(f"{name:<10}skipped: {e}")
+                continue
+            r = benchmark(paths, detector, labels)
+            print(f"{r['detector']:<10}{r['images']:>8}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['recall']:>9.1%}")
@@ -0,0 +1,217 @@
+import multiprocessing
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from detection import DETECTION_SCALE, DETECTOR
+
+# '1' runs face detection in a separate process instead of on the Tk thread
+DETECTION_PROCESS = os.environ.get('DETECTION_PROCESS', '') not in ('', '0')
+
+MAX_FRAME_SHAPE = (1080, 1920, 3)  # Largest frame a ring slot holds
+HEADER_FIELDS = 4  # Per slot: seq, height, width, channels
+_WRITING = -1  # Slot seq while the writer is copying into it
+STALL_TIMEOUT = 1.0  # Seconds after which an unanswered frame is given up on
+
+
+def worker_frame_shape(preview_size=None):
+    # Ring slot shape: MAX_FRAME_SHAPE, grown to fit the camera's preview size if that is larger
+    height, width, channels = MAX_FRAME_SHAPE
+    if preview_size is not None:
+        width, height = max(width, preview_size[0]), max(height, preview_size[1])
+    return height, width, channels
+
+
+class SharedFrameRing:
+    # Fixed slots of raw frame bytes in shared memory, each with a small header.
+    # A slot's seq is set to _WRITING before its pixels are copied and to the
+    # frame's seq afterwards, so a reader that sees the same seq before and after
+    # copying knows it got a whole frame. Only one process writes.
+    def __init__(self, slots=3, max_shape=MAX_FRAME_SHAPE, name=None):
+        self.slots = slots
+        self.slot_bytes = int(np.prod(max_shape))
+        header_bytes = slots * HEADER_FIELDS * 8
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_bytes + slots * self.slot_bytes)
+            self.owner = True
+        else:
+            self.shm = _attach(name)
+            self.owner = False
+        self.name = self.shm.name
+        self.header = np.ndarray((slots, HEADER_FIELDS), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray((slots, self.slot_bytes), dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if self.owner:
+            self.header[:] = 0
+
+    def write(self, seq, frame):
+        # Copy frame into the slot for seq and return the slot index
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of shape {frame.shape} does not fit a {self.slot_bytes} byte slot")
+        slot = seq % self.slots
+        header = self.header[slot]
+        header[0] = _WRITING
+        self.data[slot, :frame.nbytes] = np.ascontiguousarray(frame).reshape(-1)
+        height, width = frame.shape[:2]
+        header[1:] = (height, width, frame.shape[2] if frame.ndim == 3 else 1)
+        header[0] = seq
+        return slot
+
+    def read(self, slot, seq):
+        # Copy of the frame with seq in slot, or None if it was overwritten meanwhile
+        header = self.header[slot]
+        if header[0] != seq:
+            return None
+        height, width, channels = (int(v) for v in header[1:])
+        frame = self.data[slot, :height * width * channels].reshape(height, width, channels).copy()
+        if header[0] != seq:
+            return None
+        return frame[:, :, 0] if channels == 1 else frame
+
+    def close(self):
+        # Views must go before the mapping can be closed
+        self.header = self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _attach(name):
+    # Attach to the parent's segment. The spawned worker shares the parent's
+    # resource tracker, so the segment stays registered once and is unlinked
+    # by the parent alone; Python 3.13+ is told not to track it at all.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(ring_name, slots, max_shape, requests, results, detector_name, detection_scale):
+    # Runs in the worker process: detect on each requested frame and send back
+    # only (seq, boxes, seconds spent detecting)
+    import cv2
+    from detection import FaceTracker, make_detector
+
+    cv2.setNumThreads(1)  # The point is to use one other core, not to compete with the UI for all of them
+    tracker = FaceTracker(make_detector(detector_name, scale=detection_scale))
+    ring = SharedFrameRing(slots, max_shape, name=ring_name)
+    results.put(('ready', None, 0.0))
+    try:
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            seq, slot = request
+            frame = ring.read(slot, seq)
+            if frame is None:
+                results.put((seq, None, 0.0))
+                continue
+            started = time.perf_counter()
+            image = frame if tracker.detector.needs_color or frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            boxes = [tuple(int(v) for v in box) for box in tracker.update(image)]
+            results.put((seq, boxes, time.perf_counter() - started))
+    finally:
+        ring.close()
+
+
+class DetectionWorker:
+    # Face detection in a child process. submit() copies a frame into the shared
+    # ring and sends only its seq and slot; poll() collects (seq, boxes) results.
+    # At most one frame is in flight, so the worker always works on a recent
+    # frame and a frame being read is never overwritten.
+    def __init__(self, detector=DETECTOR, detection_scale=DETECTION_SCALE, slots=3, max_shape=MAX_FRAME_SHAPE):
+        self.detector = detector
+        self.detection_scale = detection_scale
+        self.slots = slots
+        self.max_shape = max_shape
+        self.ring = None
+        self.process = None
+        self.ready = False
+        self.in_flight = None  # seq of the frame the worker is busy with
+        self._submitted_at = 0.0
+        self.latest = None  # (seq, boxes) of the newest result
+        self.submitted = 0
+        self.completed = 0
+        self.skipped = 0  # Frames offered while the worker was busy
+        self.detection_seconds = 0.0  # Worker-side detection time of the newest result
+
+    def start(self):
+        # spawn rather than fork: the parent has camera, Tk and HTTP threads running
+        context = multiprocessing.get_context('spawn')
+        self.ring = SharedFrameRing(self.slots, self.max_shape)
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        self.process = context.Process(target=_worker_main, name="DetectionWorker", daemon=True,
+                                       args=(self.ring.name, self.slots, self.max_shape, self._requests, self._results,
+                                             self.detector, self.detection_scale))
+        self.process.start()
+        return self
+
+    def wait_ready(self, timeout=None):
+        # Block until the worker has loaded its detector; True once ready
+        if not self.ready:
+            try:
+                self._handle(self._results.get(timeout=timeout))
+            except queue.Empty:
+                pass
+        return self.ready
+
+    def fits(self, frame):
+        # Whether frame fits a ring slot; larger frames have to be detected elsewhere
+        return self.ring is not None and frame.nbytes <= self.ring.slot_bytes
+
+    def submit(self, seq, frame):
+        # Offer a frame for detection; returns False when the worker is still busy
+        if self.in_flight is not None and time.monotonic() - self._submitted_at > STALL_TIMEOUT:
+            self.in_flight = None  # Lost or very late; a result that still arrives is used as normal
+        if not self.ready or self.in_flight is not None:
+            self.skipped += 1
+            return False
+        slot = self.ring.write(seq, frame)
+        self._requests.put((seq, slot))
+        self.in_flight = seq
+        self._submitted_at = time.monotonic()
+        self.submitted += 1
+        return True
+
+    def _handle(self, result):
+        seq, boxes, seconds = result
+        if seq == 'ready':
+            self.ready = True
+            return
+        if seq == self.in_flight:
+            self.in_flight = None
+        if boxes is not None:
+            self.completed += 1
+            self.detection_seconds = seconds
+            self.latest = (seq, boxes)
+
+    def poll(self):
+        # Collect finished results without blocking and return the newest
+        # (seq, boxes), or None if nothing has finished yet
+        while True:
+            try:
+                self._handle(self._results.get_nowait())
+            except queue.Empty:
+                return self.latest
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def stop(self):
+        if self.process is not None:
+            self._requests.put(None)
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def report(self):
+        return (f"Detection worker: {self.submitted} frames submitted, {self.completed} detected, "
+                f"{self.skipped} skipped while busy")
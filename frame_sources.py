@@ -0,0 +1,338 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from image_files import find_images
+
+# Where the app reads frames from, as a source spec (see open_source):
+# camera[:index], video:path, images:dir, synthetic[:face image] or replay:dir
+FRAME_SOURCE = os.environ.get('FRAME_SOURCE', 'camera:0')
+# '0' replays file, image, synthetic and recorded sources as fast as they can be
+# read instead of at their original pace
+FRAME_SOURCE_REALTIME = os.environ.get('FRAME_SOURCE_REALTIME', '1') != '0'
+# When set, every frame the app reads is also recorded to this directory
+RECORD_DIR = os.environ.get('RECORD_DIR', '')
+
+TIMESTAMPS_FILE = 'timestamps.jsonl'
+
+# Every source below has the two cv2.VideoCapture methods FrameGrabber uses:
+# read() -> (ret, frame) and release(). read() returns (False, None) once a
+# finite source runs out, which FrameGrabber treats like a camera that is not ready.
+
+
+class _Pacer:
+    # Spaces reads out to match their timestamps in realtime mode; a no-op in fast mode
+    def __init__(self, realtime):
+        self.realtime = realtime
+        self._started = None
+
+    def restart(self):
+        self._started = None
+
+    def wait(self, timestamp):
+        if not self.realtime:
+            return
+        now = time.monotonic()
+        if self._started is None:
+            self._started = now - timestamp
+        delay = self._started + timestamp - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class CameraSource:
+    # A live camera; it paces itself
+    def __init__(self, index=0):
+        self.capture = cv2.VideoCapture(index)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        return self.capture.read()
+
+    # Mode negotiation (camera.negotiate_modes) goes through these
+    def set(self, prop, value):
+        return self.capture.set(prop, value)
+
+    def get(self, prop):
+        return self.capture.get(prop)
+
+    def release(self):
+        self.capture.release()
+
+
+class VideoFileSource:
+    # Frames of a video file, at the file's frame rate or as fast as they decode
+    def __init__(self, path, realtime=True, loop=False):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError(f"Could not open video {path}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.loop = loop
+        self._pacer = _Pacer(realtime)
+        self._index = 0
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        ret, frame = self.capture.read()
+        if not ret and self.loop and self._index:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self._index = 0
+            self._pacer.restart()
+            ret, frame = self.capture.read()
+        if not ret:
+            return False, None
+        self._pacer.wait(self._index / self.fps)
+        self._index += 1
+        return True, frame
+
+    def release(self):
+        self.capture.release()
+
+
+class _FrameListSource:
+    # Base for sources that play back a list of frames with known timestamps;
+    # subclasses set self.timestamps and implement _load(index)
+    def __init__(self, realtime=True, loop=False):
+        self.loop = loop
+        self._pacer = _Pacer(realtime)
+        self._index = 0
+        self.timestamps = []
+
+    def isOpened(self):
+        return bool(self.timestamps)
+
+    def read(self):
+        if self._index >= len(self.timestamps):
+            if not self.loop or not self.timestamps:
+                return False, None
+            self._index = 0
+            self._pacer.restart()
+        index = self._index
+        self._index += 1
+        frame = self._load(index)
+        if frame is None:
+            return False, None
+        self._pacer.wait(self.timestamps[index])
+        return True, frame
+
+    def _load(self, index):
+        raise NotImplementedError
+
+    def release(self):
+        self.timestamps = []
+
+
+class ImageDirSource(_FrameListSource):
+    # The images of a directory in name order, shown at fps
+    def __init__(self, directory, fps=30.0, realtime=True, loop=False):
+        super().__init__(realtime, loop)
+        self.paths = find_images(directory)
+        if not self.paths:
+            raise ValueError(f"No images in {directory}")
+        self.timestamps = [i / fps for i in range(len(self.paths))]
+
+    def _load(self, index):
+        return cv2.imread(self.paths[index])
+
+
+class RecordingSource(_FrameListSource):
+    # Replays a directory written by Recorder with the original frame timing
+    def __init__(self, directory, realtime=True, loop=False):
+        super().__init__(realtime, loop)
+        self.directory = directory
+        self.files = []
+        with open(os.path.join(directory, TIMESTAMPS_FILE)) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.files.append(entry['file'])
+                    self.timestamps.append(entry['t'])
+        if not self.files:
+            raise ValueError(f"Empty recording in {directory}")
+
+    def _load(self, index):
+        return cv2.imread(os.path.join(self.directory, self.files[index]))
+
+
+class SyntheticSource:
+    # Deterministic generated frames for runs without any input files. A face
+    # image, when given, is moved over a plain background nodding and then
+    # shaking its head, so detection and the liveliness check have something to
+    # find; without one a plain head shape is drawn instead. Sensor noise is
+    # added from a seeded generator so every run produces the same frames.
+    def __init__(self, face_image=None, size=(640, 480), fps=30.0, frames=None, realtime=True, seed=0):
+        self.width, self.height = size
+        self.fps = fps
+        self.frames = frames  # None generates frames forever
+        self._pacer = _Pacer(realtime)
+        self._rng = np.random.default_rng(seed)
+        self._index = 0
+        if face_image is not None:
+            face = cv2.imread(face_image) if isinstance(face_image, str) else face_image
+            if face is None:
+                raise ValueError(f"Could not read {face_image}")
+            scale = min(0.6 * self.height / face.shape[0], 0.6 * self.width / face.shape[1])
+            self.face = cv2.resize(face, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            self.face = None
+        self._background = np.full((self.height, self.width, 3), 200, np.uint8)
+
+    def isOpened(self):
+        return True
+
+    def _offset(self, t):
+        # Two seconds still, two nodding, two shaking, then repeat
+        phase = t % 6.0
+        amplitude = 0.08 * self.height
+        if 2.0 <= phase < 4.0:
+            return 0, int(amplitude * np.sin(2 * np.pi * (phase - 2.0)))
+        if phase >= 4.0:
+            return int(amplitude * np.sin(2 * np.pi * (phase - 4.0))), 0
+        return 0, 0
+
+    def read(self):
+        if self.frames is not None and self._index >= self.frames:
+            return False, None
+        t = self._index / self.fps
+        self._index += 1
+        dx, dy = self._offset(t)
+
+        frame = self._background.copy()
+        if self.face is not None:
+            h, w = self.face.shape[:2]
+            x = (self.width - w) // 2 + dx
+            y = (self.height - h) // 2 + dy
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(self.width, x + w), min(self.height, y + h)
+            frame[y0:y1, x0:x1] = self.face[y0 - y:y1 - y, x0 - x:x1 - x]
+        else:
+            center = (self.width // 2 + dx, self.height // 2 + dy)
+            axes = (int(self.height * 0.15), int(self.height * 0.2))
+            cv2.ellipse(frame, center, axes, 0, 0, 360, (150, 170, 200), -1)
+            for side in (-1, 1):
+                cv2.circle(frame, (center[0] + side * axes[0] // 2, center[1] - axes[1] // 4), axes[0] // 8, (60, 60, 60), -1)
+        noise = self._rng.integers(-4, 5, frame.shape, dtype=np.int16)
+        frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+        self._pacer.wait(t)
+        return True, frame
+
+    def release(self):
+        pass
+
+
+class Recorder:
+    # Wraps a source and writes every frame it returns, with its arrival time,
+    # to directory in the layout RecordingSource replays. Encoding and disk
+    # writes happen on a writer thread so recording doesn't slow down reads;
+    # if the writer falls more than max_pending frames behind, frames are
+    # skipped (and counted) rather than stalling the camera.
+    def __init__(self, source, directory, image_format='png', max_pending=64):
+        self.source = source
+        self.directory = directory
+        self.image_format = image_format
+        self.recorded = 0
+        self.skipped = 0
+        os.makedirs(directory, exist_ok=True)
+        self._timestamps = open(os.path.join(directory, TIMESTAMPS_FILE), 'w')
+        self._started = None
+        self._index = 0
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._writer = threading.Thread(target=self._write_frames, name="Recorder", daemon=True)
+        self._writer.start()
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def __getattr__(self, name):
+        # Anything else, such as a camera's set()/get(), goes to the wrapped source
+        return getattr(self.source, name)
+
+    def read(self):
+        ret, frame = self.source.read()
+        if ret:
+            now = time.monotonic()
+            if self._started is None:
+                self._started = now
+            self._index += 1
+            try:
+                self._pending.put_nowait((self._index, now - self._started, frame))
+            except queue.Full:
+                self.skipped += 1
+        return ret, frame
+
+    def _write_frames(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            index, timestamp, frame = item
+            name = f"{index:06d}.{self.image_format}"
+            cv2.imwrite(os.path.join(self.directory, name), frame)
+            self._timestamps.write(json.dumps({'file': name, 't': round(timestamp, 6)}) + '\n')
+            self.recorded += 1
+
+    def release(self):
+        # Finish writing what was queued, then release the wrapped source
+        if self._writer.is_alive():
+            self._pending.put(None)
+            self._writer.join()
+            self._timestamps.close()
+        self.source.release()
+
+
+def open_source(spec=None, realtime=None, record_dir=None):
+    # Build a frame source from a spec such as 'camera:0', 'video:session.mp4',
+    # 'images:frames/', 'synthetic', 'synthetic:face.png' or 'replay:recording/'.
+    # Defaults come from FRAME_SOURCE, FRAME_SOURCE_REALTIME and RECORD_DIR.
+    spec = spec or FRAME_SOURCE
+    realtime = FRAME_SOURCE_REALTIME if realtime is None else realtime
+    record_dir = RECORD_DIR if record_dir is None else record_dir
+    kind, _, arg = spec.partition(':')
+
+    if kind == 'camera':
+        source = CameraSource(int(arg) if arg else 0)
+    elif kind == 'video':
+        source = VideoFileSource(arg, realtime=realtime)
+    elif kind == 'images':
+        source = ImageDirSource(arg, realtime=realtime)
+    elif kind == 'synthetic':
+        source = SyntheticSource(arg or None, realtime=realtime)
+    elif kind == 'replay':
+        source = RecordingSource(arg, realtime=realtime)
+    else:
+        raise ValueError(f"Unknown frame source {spec!r}")
+
+    if record_dir:
+        source = Recorder(source, record_dir)
+    return source
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record frames from a source for later replay")
+    parser.add_argument("output", help="Directory to record into")
+    parser.add_argument("--source", default=FRAME_SOURCE, help="Source spec, e.g. camera:0 or video:session.mp4")
+    parser.add_argument("--seconds", type=float, default=10.0, help="How long to record")
+    parser.add_argument("--format", default='png', help="Image format of the recorded frames (png is lossless)")
+    args = parser.parse_args()
+
+    recorder = Recorder(open_source(args.source, record_dir=''), args.output, args.format)
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        ret, _ = recorder.read()
+        if not ret:
+            if not isinstance(recorder.source, CameraSource):
+                break  # A finite source ran out
+            time.sleep(0.01)
+    recorder.release()
+    print(f"Recorded {recorder.recorded} frames to {args.output} ({recorder.skipped} skipped)")
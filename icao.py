@@ -0,0 +1,123 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+# Constants for ICAO passport size (35mm x 45mm) at 600 DPI
+ICAO_WIDTH_PX = 827
+ICAO_HEIGHT_PX = 1063
+
+# ICAO head geometry as fractions of the photo height: chin to crown should be
+# 32-36mm of the 45mm (about 0.71-0.80), and the eye line sits a little above
+# the middle of the photo.
+HEAD_HEIGHT_RATIO = 0.75
+EYE_LINE_FROM_TOP = 0.43
+
+# Where a Haar frontal-face box sits on the head, as fractions of the box height
+# measured from the top of the box: it spans roughly forehead to mouth.
+HAAR_EYE_LINE = 0.38
+HAAR_CROWN = -0.3
+HAAR_CHIN = 1.25
+
+# Uniform light background for the finished photo (BGR)
+BACKGROUND_COLOR = (240, 240, 240)
+FEATHER_SIGMA = 1.5  # Gaussian blur applied to the alpha edge, in pixels; 0 disables
+
+
+def crop_box(face_box):
+    # ICAO crop (x, y, w, h) for a face box, in frame coordinates. It keeps the
+    # 35:45 aspect and may extend past the frame edges.
+    x, y, w, h = face_box
+    head_height = (HAAR_CHIN - HAAR_CROWN) * h
+    crop_height = head_height / HEAD_HEIGHT_RATIO
+    crop_width = crop_height * ICAO_WIDTH_PX / ICAO_HEIGHT_PX
+    eye_y = y + HAAR_EYE_LINE * h
+    top = eye_y - EYE_LINE_FROM_TOP * crop_height
+    left = x + w / 2 - crop_width / 2
+    return int(round(left)), int(round(top)), int(round(crop_width)), int(round(crop_height))
+
+
+def face_box_in_crop(face_box, size=(ICAO_WIDTH_PX, ICAO_HEIGHT_PX)):
+    # Where face_box ends up inside crop_to_icao's output of size (width, height)
+    cx, cy, cw, ch = crop_box(face_box)
+    sx, sy = size[0] / cw, size[1] / ch
+    x, y, w, h = face_box
+    return int(round((x - cx) * sx)), int(round((y - cy) * sy)), int(round(w * sx)), int(round(h * sy))
+
+
+def nominal_face_box(size=(ICAO_WIDTH_PX, ICAO_HEIGHT_PX)):
+    # Face box of any ICAO crop of size: crop_box places a square face box at
+    # the same relative position whatever its size, so the original box isn't needed
+    return face_box_in_crop((0, 0, 1000, 1000), size)
+
+
+def is_icao_shaped(image):
+    # True for images with the 35:45 aspect of an ICAO crop
+    height, width = image.shape[:2]
+    return abs(width / height - ICAO_WIDTH_PX / ICAO_HEIGHT_PX) < 0.01
+
+
+def crop_to_icao(frame, face_box):
+    # Crop frame around face_box with ICAO proportions and resize it once to
+    # ICAO size. Parts of the crop outside the frame are filled by replicating
+    # the frame edge.
+    cx, cy, cw, ch = crop_box(face_box)
+    height, width = frame.shape[:2]
+    x0, y0 = max(0, cx), max(0, cy)
+    x1, y1 = min(width, cx + cw), min(height, cy + ch)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError("Face box is outside the frame")
+
+    crop = frame[y0:y1, x0:x1]
+    if (x0 - cx, y0 - cy, cx + cw - x1, cy + ch - y1) != (0, 0, 0, 0):
+        crop = cv2.copyMakeBorder(crop, y0 - cy, cy + ch - y1, x0 - cx, cx + cw - x1, cv2.BORDER_REPLICATE)
+
+    interpolation = cv2.INTER_AREA if cw > ICAO_WIDTH_PX else cv2.INTER_CUBIC
+    return cv2.resize(crop, (ICAO_WIDTH_PX, ICAO_HEIGHT_PX), interpolation=interpolation)
+
+
+def fit_to_icao(image, border_value=0):
+    # Scale image to fit ICAO_WIDTH_PX x ICAO_HEIGHT_PX without distortion and
+    # pad the rest with border_value
+    height, width = image.shape[:2]
+    if (width, height) == (ICAO_WIDTH_PX, ICAO_HEIGHT_PX):
+        return image
+    scale = min(ICAO_WIDTH_PX / width, ICAO_HEIGHT_PX / height)
+    new_width, new_height = round(width * scale), round(height * scale)
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    resized = cv2.resize(image, (new_width, new_height), interpolation=interpolation)
+    left = (ICAO_WIDTH_PX - new_width) // 2
+    top = (ICAO_HEIGHT_PX - new_height) // 2
+    return cv2.copyMakeBorder(resized, top, ICAO_HEIGHT_PX - new_height - top, left, ICAO_WIDTH_PX - new_width - left,
+                              cv2.BORDER_CONSTANT, value=border_value)
+
+
+def solid_background(color, size):
+    # A read-only image of one color, built once per color and (width, height)
+    return _solid_background(tuple(int(c) for c in color), size)
+
+
+@lru_cache(maxsize=4)
+def _solid_background(color, size):
+    background = np.empty((size[1], size[0], len(color)), np.uint8)
+    background[:] = color
+    background.flags.writeable = False
+    return background
+
+
+def composite_on_background(bgra, color=BACKGROUND_COLOR, feather=FEATHER_SIGMA):
+    # Blend a BGRA cut-out onto a solid color and return a print-ready BGR image
+    # of exactly ICAO size. Alpha stays 8-bit and the blend is two saturating
+    # OpenCV multiplies, so no float copies of the image are made.
+    bgra = fit_to_icao(bgra, border_value=(0, 0, 0, 0))  # Padding is transparent, so it takes the background color
+    alpha = bgra[:, :, 3]
+    if feather > 0:
+        # Soften the hard mask edge so hair and shoulders blend into the background
+        alpha = cv2.GaussianBlur(alpha, (0, 0), feather)
+    alpha = cv2.merge((alpha, alpha, alpha))
+
+    foreground = cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR)
+    background = solid_background(color, (foreground.shape[1], foreground.shape[0]))
+    # foreground * alpha + background * (1 - alpha), with alpha in 0-255
+    blended = cv2.multiply(foreground, alpha, scale=1 / 255)
+    return cv2.add(blended, cv2.multiply(background, cv2.bitwise_not(alpha), scale=1 / 255))
@@ -0,0 +1,34 @@
+import glob
+import os
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def find_images(source):
+    # A directory is scanned for images, anything else is treated as a glob
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(p))
+
+
+def output_names(paths, extension='.png'):
+    # Name each input's output by its path relative to the inputs' common
+    # directory, so p.jpg in two subdirectories gives x/p.png and y/p.png rather
+    # than one overwriting the other. Returns (names, clashes): names maps a path
+    # to its output name; inputs that would still share one (a.jpg next to a.png)
+    # are left out of names and map, in clashes, to the input that took it first.
+    names, clashes, owners = {}, {}, {}
+    if not paths:
+        return names, clashes
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    for path in paths:
+        name = os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0] + extension
+        key = os.path.normcase(name)
+        if key in owners:
+            clashes[path] = owners[key]
+        else:
+            owners[key] = path
+            names[path] = name
+    return names, clashes
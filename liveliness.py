@@ -0,0 +1,66 @@
+import time
+
+# Liveliness check phases
+VERTICAL = 'vertical'  # Waiting for the head to move up and down
+HORIZONTAL = 'horizontal'  # Waiting for the head to move left and right
+PASSED = 'passed'
+FAILED = 'failed'
+
+INSTRUCTIONS = {
+    VERTICAL: "Please move your head up and down for 5 seconds...",
+    HORIZONTAL: "Great! Now move your head left and right for 5 seconds...",
+    PASSED: "Liveliness check complete! You may capture your photo.",
+    FAILED: "Liveliness check failed! Please try again.",
+}
+
+
+class LivelinessCheck:
+    # Incremental liveliness check. Instead of looping over the camera itself it is
+    # fed one set of face detections per preview tick and advances through its
+    # phases, so the Tk event loop is never blocked.
+    def __init__(self, phase_timeout=5.0, phase_frame_budget=150):
+        self.phase_timeout = phase_timeout  # Seconds allowed per phase
+        self.phase_frame_budget = phase_frame_budget  # Frames allowed per phase
+        self.restart()
+
+    def restart(self, now=None):
+        self._enter(VERTICAL, now)
+
+    def _enter(self, phase, now=None):
+        self.phase = phase
+        self.phase_started = time.monotonic() if now is None else now
+        self.phase_frames = 0
+
+    @property
+    def done(self):
+        return self.phase in (PASSED, FAILED)
+
+    @property
+    def passed(self):
+        return self.phase == PASSED
+
+    @property
+    def instruction(self):
+        return INSTRUCTIONS[self.phase]
+
+    def update(self, faces, now=None):
+        # Feed the detections for one new frame and return the current phase
+        if self.done:
+            return self.phase
+
+        now = time.monotonic() if now is None else now
+        self.phase_frames += 1
+
+        if len(faces) > 0:
+            self._enter(HORIZONTAL if self.phase == VERTICAL else PASSED, now)
+        elif now - self.phase_started >= self.phase_timeout or self.phase_frames >= self.phase_frame_budget:
+            self._enter(FAILED, now)
+        return self.phase
+
+    def tick(self, now=None):
+        # Check the phase timeout on ticks where no new frame arrived
+        if not self.done:
+            now = time.monotonic() if now is None else now
+            if now - self.phase_started >= self.phase_timeout:
+                self._enter(FAILED, now)
+        return self.phase
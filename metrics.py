@@ -0,0 +1,222 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Collection is off unless METRICS is set (or the debug overlay is opened), and
+# every call below returns straight away while it is off
+METRICS = os.environ.get('METRICS', '') not in ('', '0')
+METRICS_DUMP = os.environ.get('METRICS_DUMP', '')  # File a JSON line is appended to every METRICS_DUMP_INTERVAL
+METRICS_DUMP_INTERVAL = float(os.environ.get('METRICS_DUMP_INTERVAL', '10'))
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))  # Serves /metrics in Prometheus text format on localhost
+
+PREFIX = 'idphoto_'
+# Histogram bucket upper bounds in seconds, from a fast preview tick to a slow API call
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECENT = 512  # Observations kept per histogram for the quantiles in snapshots
+
+
+def _key(name, labels):
+    return name if not labels else (name, tuple(sorted(labels.items())))
+
+
+def _name(key):
+    if isinstance(key, str):
+        return key, ''
+    name, labels = key
+    return name, '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+def _quantile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Histogram:
+    # Cumulative bucket counts for export plus the last RECENT observations for quantiles
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def summary(self):
+        recent = sorted(self.recent)
+        return {'count': self.count, 'sum': self.sum,
+                'p50': _quantile(recent, 0.50), 'p95': _quantile(recent, 0.95), 'p99': _quantile(recent, 0.99)}
+
+
+class _NullTimer:
+    # Returned by Metrics.timer while collection is off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._observe(self.key, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    # Counters, gauges and latency histograms for the hot paths. Names follow
+    # Prometheus conventions (seconds, _total for counters); labels are an
+    # optional dict. Safe to call from any thread.
+    def __init__(self, enabled=METRICS):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self.started = time.time()
+
+    def timer(self, name, labels=None):
+        # Context manager recording the time spent in its block into histogram name
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, _key(name, labels))
+
+    def observe(self, name, seconds, labels=None):
+        if self.enabled:
+            self._observe(_key(name, labels), seconds)
+
+    def _observe(self, key, seconds):
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, labels=None):
+        if self.enabled:
+            key = _key(name, labels)
+            with self._lock:
+                self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name, value, labels=None):
+        # Set a value sampled at this moment, like a queue depth
+        if self.enabled:
+            with self._lock:
+                self._gauges[_key(name, labels)] = value
+
+    def snapshot(self):
+        # Plain dict of everything recorded so far, for the overlay and the JSON dump
+        with self._lock:
+            return {
+                'counters': {''.join(_name(k)): v for k, v in self._counters.items()},
+                'gauges': {''.join(_name(k)): v for k, v in self._gauges.items()},
+                'histograms': {''.join(_name(k)): h.summary() for k, h in self._histograms.items()},
+            }
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            for kind, values in (('counter', self._counters), ('gauge', self._gauges)):
+                typed = set()
+                for key, value in sorted(values.items(), key=lambda item: str(item[0])):
+                    name, labels = _name(key)
+                    if name not in typed:
+                        typed.add(name)
+                        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                    lines.append(f"{PREFIX}{name}{labels} {value}")
+            typed = set()
+            for key, histogram in sorted(self._histograms.items(), key=lambda item: str(item[0])):
+                name, labels = _name(key)
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {PREFIX}{name} histogram")
+                label_prefix = labels[1:-1] + ',' if labels else ''
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{PREFIX}{name}_bucket{{{label_prefix}le="{bound}"}} {cumulative}')
+                lines.append(f"{PREFIX}{name}_sum{labels} {histogram.sum}")
+                lines.append(f"{PREFIX}{name}_count{labels} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()  # Shared by the app, the HTTP client and the command-line tools
+
+
+def _dump_loop(registry, path, interval):
+    while True:
+        time.sleep(interval)
+        with open(path, 'a') as f:
+            f.write(json.dumps({'time': time.time(), **registry.snapshot()}) + '\n')
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = metrics
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+def start_exporters(registry=metrics, dump_path=METRICS_DUMP, interval=METRICS_DUMP_INTERVAL, port=METRICS_PORT):
+    # Start the periodic JSON-lines dump and the /metrics endpoint, each only
+    # when configured; either one turns collection on. Returns the HTTP server, if any.
+    server = None
+    if dump_path:
+        registry.enabled = True
+        threading.Thread(target=_dump_loop, args=(registry, dump_path, interval), name="MetricsDump", daemon=True).start()
+    if port:
+        registry.enabled = True
+        handler = type('Handler', (_MetricsHandler,), {'registry': registry})
+        server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        threading.Thread(target=server.serve_forever, name="MetricsHTTP", daemon=True).start()
+    return server
+
+
+def overlay_text(registry=metrics):
+    # A few lines summarising the hot paths, for the on-screen debug overlay
+    snapshot = registry.snapshot()
+    histograms, counters, gauges = snapshot['histograms'], snapshot['counters'], snapshot['gauges']
+    lines = []
+    for name, label in (('display_frame_seconds', 'tick'), ('detection_seconds', 'detect'),
+                        ('capture_photo_seconds', 'capture'), ('background_removal_seconds', 'bg removal')):
+        if name in histograms:
+            h = histograms[name]
+            lines.append(f"{label}: p50 {h['p50'] * 1000:.1f} p95 {h['p95'] * 1000:.1f} ms (n={h['count']})")
+    http = [h for name, h in histograms.items() if name.startswith('http_request_seconds')]
+    if http:
+        lines.append(f"http: p95 {max(h['p95'] for h in http) * 1000:.0f} ms, {sum(h['count'] for h in http)} requests, "
+                     f"{counters.get('http_retries_total', 0)} retries")
+    lines.append(f"fps {gauges.get('preview_fps', 0):.1f} / camera {gauges.get('camera_fps', 0):.1f}, "
+                 f"dropped {gauges.get('frames_dropped', 0)} (grabber {gauges.get('grabber_dropped_frames', 0)})")
+    lines.append(f"detect every {gauges.get('detection_every', 1)}, bg jobs {gauges.get('background_jobs', 0)}")
+    return '\n'.join(lines)
@@ -0,0 +1,49 @@
+from collections import namedtuple
+
+from detection import detector_input
+from icao import crop_to_icao
+
+PhotoResult = namedtuple('PhotoResult', ['photo', 'face_box'])
+
+
+class NoFaceDetected(Exception):
+    pass
+
+
+def primary_face(faces):
+    # The largest face is the person being photographed
+    return max(faces, key=lambda f: f[2] * f[3])
+
+
+def scale_box(box, from_shape, to_shape):
+    # Map (x, y, w, h) from an image of from_shape to one of to_shape, e.g. from
+    # the preview stream to a full-resolution still of the same scene
+    sx = to_shape[1] / from_shape[1]
+    sy = to_shape[0] / from_shape[0]
+    x, y, w, h = box
+    return int(round(x * sx)), int(round(y * sy)), int(round(w * sx)), int(round(h * sy))
+
+
+def refine_face(image, box, detector, padding=0.5):
+    # Re-detect the face in a padded region around box, to correct for movement
+    # between the frame box came from and image. Returns box if nothing is found.
+    x, y, w, h = box
+    x0, y0 = max(0, x - int(w * padding)), max(0, y - int(h * padding))
+    x1, y1 = min(image.shape[1], x + w + int(w * padding)), min(image.shape[0], y + h + int(h * padding))
+    if x1 <= x0 or y1 <= y0:
+        return box
+    faces = detector.detect(detector_input(detector, image[y0:y1, x0:x1]))
+    if len(faces) == 0:
+        return box
+    fx, fy, fw, fh = primary_face(faces)
+    return x0 + fx, y0 + fy, fw, fh
+
+
+def process_image(image, detector):
+    # GUI-free capture core: detect the face in a BGR image and return the ICAO crop.
+    # Raises NoFaceDetected when the detector finds nothing.
+    faces = detector.detect(detector_input(detector, image))
+    if len(faces) == 0:
+        raise NoFaceDetected("No face detected")
+    face_box = primary_face(faces)
+    return PhotoResult(crop_to_icao(image, face_box), face_box)
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class PreviewRenderer:
+    # Renders the live feed into buffers allocated once: the frame is resized
+    # before any colour conversion, converted in place, and pasted into a single
+    # persistent PhotoImage rather than building a new one on every tick.
+    def __init__(self, size):
+        self.size = size
+        width, height = size
+        self._small = np.empty((height, width, 3), dtype=np.uint8)
+        self._rgba = np.empty((height, width, 4), dtype=np.uint8)
+        # PIL image sharing memory with self._rgba, so it never needs rebuilding
+        self._image = Image.frombuffer('RGBA', size, self._rgba, 'raw', 'RGBA', 0, 1)
+        self.photo = None  # Created on the first render, once the Tk root exists
+
+    def draw(self, frame, faces=()):
+        # Draw frame with the faces outlined into the RGBA buffer and return the
+        # PIL image over it; needs no Tk, so it can be benchmarked headless
+        width, height = self.size
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+
+        sx = width / frame.shape[1]
+        sy = height / frame.shape[0]
+        for (x, y, w, h) in faces:
+            cv2.rectangle(self._small, (int(x * sx), int(y * sy)), (int((x + w) * sx), int((y + h) * sy)), (255, 0, 0), 2)
+
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2RGBA, dst=self._rgba)
+        return self._image
+
+    def render(self, frame, faces=()):
+        # Draw frame with the faces outlined and return the PhotoImage to show
+        self.draw(frame, faces)
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(image=self._image)
+        else:
+            self.photo.paste(self._image)
+        return self.photo
@@ -0,0 +1,201 @@
+import email.utils
+import os
+import random
+import threading
+import time
+
+from metrics import metrics
+
+# requests is imported when the first client is created, so importing this
+# module (for RemoveBgError, say) stays cheap at app startup
+
+BASE_URL = 'https://api.remove.bg/v1.0'
+API_KEY = os.environ.get('REMOVE_BG_API_KEY', 'INSERT_YOUR_API_KEY_HERE')  # Replace with your actual API key
+
+# Responses worth retrying: rate limited or a temporary server-side failure
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Methods safe to resend after a failure mid-request; a POST to /removebg that
+# reached the server may already have been billed
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RemoveBgError(Exception):
+    # status_code is None when the request never got a response (connection failure, timeout)
+    def __init__(self, status_code, message):
+        super().__init__(f"Error: {status_code}, {message}" if status_code is not None else f"Error: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RemoveBgClient:
+    # One client for every remove.bg call. A single requests.Session keeps
+    # connections alive between calls, failed requests are retried a bounded
+    # number of times with jittered exponential backoff (honouring Retry-After),
+    # and the rate-limit and credit headers of the last response are kept.
+    def __init__(self, api_key=API_KEY, base_url=BASE_URL, max_retries=3, backoff=0.5, max_backoff=30.0,
+                 timeout=(5, 60), pool_size=4):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout  # (connect, read) seconds
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._requests = requests
+        self.session = requests.Session()
+        self.session.headers['X-Api-Key'] = api_key
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self.rate_limit = None  # Requests allowed per window
+        self.rate_limit_remaining = None
+        self.rate_limit_reset = None  # Unix time the window resets
+        self.credits_charged = 0.0  # Credits charged by removebg calls through this client
+        self.last_credits_charged = None
+        self._credit_listeners = []
+
+    def add_credit_listener(self, callback):
+        # callback(credits) is called, on the requesting thread, after every
+        # response that reports X-Credits-Charged
+        self._credit_listeners.append(callback)
+
+    def _record_headers(self, response):
+        headers = response.headers
+        charged = None
+        with self._lock:
+            for attr, header in (('rate_limit', 'X-RateLimit-Limit'),
+                                 ('rate_limit_remaining', 'X-RateLimit-Remaining'),
+                                 ('rate_limit_reset', 'X-RateLimit-Reset')):
+                if header in headers:
+                    try:
+                        setattr(self, attr, int(headers[header]))
+                    except ValueError:
+                        pass
+            if 'X-Credits-Charged' in headers:
+                try:
+                    self.last_credits_charged = float(headers['X-Credits-Charged'])
+                except ValueError:
+                    pass
+                else:
+                    self.credits_charged += self.last_credits_charged
+                    charged = self.last_credits_charged
+        if charged:
+            for callback in self._credit_listeners:
+                callback(charged)
+
+    def _backoff_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        # Full jitter spreads out retries from several kiosks hitting the same limit
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _never_sent(self, error):
+        # True when error happened while connecting, so the server never saw the request
+        from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+        requests = self._requests
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        if isinstance(error, requests.ConnectionError) and not isinstance(error, requests.Timeout):
+            reason = getattr(error.args[0], 'reason', None) if error.args else None
+            return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+        return False
+
+    def request(self, method, path, **kwargs):
+        # Send a request, retrying connection failures and RETRY_STATUSES responses.
+        # Other methods than IDEMPOTENT_METHODS are only resent when the failure
+        # happened before the request went out (see _never_sent). A request that
+        # still fails without a response raises RemoveBgError(None, ...).
+        requests = self._requests
+        kwargs.setdefault('timeout', self.timeout)
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        attempt = 0
+        labels = {'path': path}
+        while True:
+            try:
+                with metrics.timer('http_request_seconds', labels):
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.inc('http_errors_total', labels={'path': path, 'error': type(e).__name__})
+                retryable = method.upper() in IDEMPOTENT_METHODS or self._never_sent(e)
+                if attempt >= self.max_retries or not retryable:
+                    raise RemoveBgError(None, f"{type(e).__name__}: {e}") from e
+                metrics.inc('http_retries_total')
+                time.sleep(self._backoff_delay(attempt))
+                attempt += 1
+                continue
+            except requests.RequestException as e:
+                metrics.inc('http_errors_total', labels={'path': path, 'error': type(e).__name__})
+                raise RemoveBgError(None, f"{type(e).__name__}: {e}") from e
+
+            metrics.inc('http_responses_total', labels={'path': path, 'status': response.status_code})
+            self._record_headers(response)
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                metrics.inc('http_retries_total')
+                time.sleep(self._backoff_delay(attempt, response))
+                attempt += 1
+                continue
+            return response
+
+    @staticmethod
+    def _error(response):
+        try:
+            errors = response.json()['errors']
+            message = '; '.join(error.get('title', '') for error in errors)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            message = response.text
+        return RemoveBgError(response.status_code, message)
+
+    def remove_background(self, image_bytes, **params):
+        # POST /removebg and return the encoded result image
+        response = self.request('POST', 'removebg', files={'image_file': image_bytes}, data=params)
+        if response.status_code != 200:
+            raise self._error(response)
+        return response.content
+
+    def account(self):
+        # GET /account and return its attributes (credits and api usage)
+        response = self.request('GET', 'account')
+        if response.status_code != 200:
+            raise self._error(response)
+        try:
+            return response.json()['data']['attributes']
+        except (ValueError, KeyError, TypeError) as e:
+            # A 200 that isn't the API's JSON, e.g. a captive portal or proxy page
+            raise RemoveBgError(response.status_code, f"Unexpected /account response: {type(e).__name__}") from e
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # The shared client used by the app
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = RemoveBgClient()
+        return _client
@@ -0,0 +1,88 @@
+import math
+import time
+
+
+class FrameScheduler:
+    # Chooses when the next preview tick runs and which ticks run face detection.
+    # It measures the cost of rendering and of detection separately, together
+    # with the rate the camera actually delivers frames, and keeps the preview
+    # loop's share of the main thread within cpu_budget.
+    def __init__(self, cpu_budget=0.6, min_delay_ms=5, max_delay_ms=100, smoothing=0.1):
+        self.cpu_budget = cpu_budget  # Fraction of wall time the preview loop may use
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.smoothing = smoothing  # Weight of the newest sample in the moving averages
+
+        self.tick_cost = 0.0  # Seconds per tick, excluding detection
+        self.detection_cost = 0.0  # Seconds per detection pass
+        self.camera_fps = 0.0
+        self.achieved_fps = 0.0  # Rate of new frames actually shown
+        self.detection_every = 1  # Run detection on one shown frame in this many
+        self.frames_shown = 0
+        self.frames_dropped = 0  # Camera frames never shown because the preview fell behind
+
+        self._last_seq = None
+        self._last_seq_time = None
+        self._last_shown_time = None
+        self._frames_since_detection = 0
+        self._detection_time = 0.0
+        self._shown_this_tick = False
+
+    def _average(self, current, sample):
+        return sample if current == 0 else current + self.smoothing * (sample - current)
+
+    def detection_due(self):
+        # True when the frame just passed to frame_shown should run detection
+        return self._frames_since_detection >= self.detection_every
+
+    def record_detection(self, seconds):
+        self._detection_time += seconds
+        self.detection_cost = self._average(self.detection_cost, seconds)
+        self._frames_since_detection = 0
+
+    def frame_shown(self, seq, now=None):
+        # Record that the frame with grabber sequence number seq was shown
+        now = time.perf_counter() if now is None else now
+        if self._last_seq is not None and seq > self._last_seq:
+            self.frames_dropped += seq - self._last_seq - 1
+            elapsed = now - self._last_seq_time
+            if elapsed > 0:
+                self.camera_fps = self._average(self.camera_fps, (seq - self._last_seq) / elapsed)
+        if self._last_shown_time is not None and now > self._last_shown_time:
+            self.achieved_fps = self._average(self.achieved_fps, 1.0 / (now - self._last_shown_time))
+        self._last_seq = seq
+        self._last_seq_time = now
+        self._last_shown_time = now
+        self.frames_shown += 1
+        self._frames_since_detection += 1
+        self._shown_this_tick = True
+
+    def end_tick(self, started, now=None):
+        # Finish a tick that began at started (time.perf_counter()) and return the
+        # delay in milliseconds until the next one
+        now = time.perf_counter() if now is None else now
+        elapsed = now - started
+        if self._shown_this_tick:
+            # Only ticks that rendered a frame say anything about rendering cost
+            self.tick_cost = self._average(self.tick_cost, max(0.0, elapsed - self._detection_time))
+        self._detection_time = 0.0
+        self._shown_this_tick = False
+
+        # Never poll faster than the camera delivers, nor faster than the budget allows
+        interval = self.tick_cost / self.cpu_budget
+        if self.camera_fps > 0:
+            interval = max(interval, 1.0 / self.camera_fps)
+
+        # Spread detection over enough frames that its average cost fits what is left
+        spare = interval * self.cpu_budget - self.tick_cost
+        if self.detection_cost > 0:
+            self.detection_every = max(1, math.ceil(self.detection_cost / spare)) if spare > 0 else 30
+            self.detection_every = min(self.detection_every, 30)
+
+        delay_ms = (interval - elapsed) * 1000
+        return int(min(self.max_delay_ms, max(self.min_delay_ms, delay_ms)))
+
+    def summary(self):
+        return (f"Preview: {self.achieved_fps:.1f} fps shown, camera {self.camera_fps:.1f} fps, "
+                f"{self.frames_shown} frames shown, {self.frames_dropped} dropped, "
+                f"detection every {self.detection_every} frame(s)")
@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# Cold-start budgets in seconds, measured from when the app module starts loading
+BUDGETS = {
+    'window shown': 0.5,
+    'ready': 3.0,  # Camera streaming, detector and background backend loaded
+}
+
+# '1' prints the trace once the app is ready; any other value is a file the
+# trace is appended to as a JSON line, for tracking regressions across builds
+STARTUP_TRACE = os.environ.get('STARTUP_TRACE', '')
+
+
+class StartupTrace:
+    # Records how long each startup stage took to reach, and on which thread
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks = []
+        self._lock = threading.Lock()
+
+    def mark(self, stage):
+        with self._lock:
+            self.marks.append((stage, time.perf_counter() - self.started, threading.current_thread().name))
+
+    def elapsed(self, stage):
+        for name, seconds, _ in self.marks:
+            if name == stage:
+                return seconds
+        return None
+
+    def over_budget(self):
+        # Stages that took longer than their budget, as (stage, seconds, budget)
+        return [(stage, self.elapsed(stage), budget) for stage, budget in BUDGETS.items()
+                if self.elapsed(stage) is not None and self.elapsed(stage) > budget]
+
+    def report(self):
+        for stage, seconds, budget in self.over_budget():
+            print(f"Startup: '{stage}' took {seconds:.2f}s, over its {budget:.2f}s budget", file=sys.stderr)
+        if STARTUP_TRACE == '1':
+            for stage, seconds, thread in self.marks:
+                print(f"Startup: {seconds * 1000:8.1f} ms  {stage} [{thread}]")
+        elif STARTUP_TRACE:
+            with open(STARTUP_TRACE, 'a') as f:
+                f.write(json.dumps({'time': time.time(), 'marks': [[stage, round(seconds, 4)] for stage, seconds, _ in self.marks],
+                                    'over_budget': [stage for stage, _, _ in self.over_budget()]}) + '\n')
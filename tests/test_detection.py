@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pytest
+
+from detection import Detection, _ScaledDetector, compare_scales
+
+FACE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures', 'face.jpg')
+
+
+@pytest.mark.parametrize('scale', [0.5, 0.25])
+def test_scaled_detection_agrees_with_full_resolution(scale):
+    frames, reference_boxes, matched, mean_iou = compare_scales([FACE], scale, 'haar')
+    assert frames == 1
+    assert reference_boxes >= 1
+    assert matched == reference_boxes
+    assert mean_iou > 0.9
+
+
+class _FixedDetector(_ScaledDetector):
+    # Reports one face at a fixed place in the downscaled image it is given
+    name = 'fixed'
+
+    def _detect_small(self, small, min_size):
+        self.small_shape = small.shape
+        self.small_min_size = min_size
+        return [((10, 20, 30, 40), 1.0, [(15.0, 25.0)])]
+
+
+def test_detect_full_maps_boxes_to_full_frame_coordinates():
+    detector = _FixedDetector(scale=0.25, min_size=(100, 100))
+    detections = detector.detect_full(np.zeros((480, 640), np.uint8))
+    assert detector.small_shape == (120, 160)
+    assert detector.small_min_size == (25, 25)
+    assert detections == [Detection((40, 80, 120, 160), 1.0, [(60.0, 100.0)])]
+
+
+def test_full_scale_passes_the_image_through():
+    detector = _FixedDetector(scale=1.0)
+    assert detector.detect(np.zeros((48, 64), np.uint8)) == [(10, 20, 30, 40)]
+    assert detector.small_shape == (48, 64)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from icao import ICAO_HEIGHT_PX, ICAO_WIDTH_PX, composite_on_background, crop_box, crop_to_icao, face_box_in_crop
+
+BOXES = [(100, 80, 150, 150), (0, 0, 90, 90), (300, 200, 37, 41), (10, 20, 600, 600)]
+
+
+@pytest.mark.parametrize('box', BOXES)
+def test_crop_box_has_icao_aspect(box):
+    _, _, width, height = crop_box(box)
+    # Rounded to whole pixels, so allow one pixel either way
+    assert abs(width - height * 35 / 45) <= 1
+
+
+def test_crop_box_holds_the_head():
+    x, y, w, h = 200, 150, 100, 100
+    cx, cy, cw, ch = crop_box((x, y, w, h))
+    assert cx < x and cx + cw > x + w
+    assert cy < y and cy + ch > y + h
+    assert abs(cx + cw / 2 - (x + w / 2)) <= 1  # Centred horizontally on the face
+
+
+@pytest.mark.parametrize('box', BOXES)
+def test_crop_to_icao_output_size(box):
+    frame = np.full((480, 640, 3), 50, np.uint8)
+    assert crop_to_icao(frame, box).shape == (ICAO_HEIGHT_PX, ICAO_WIDTH_PX, 3)
+
+
+@pytest.mark.parametrize('box', [(0, 0, 120, 120), (520, 0, 120, 120), (0, 360, 120, 120), (520, 360, 120, 120)])
+def test_corner_boxes_replicate_the_edge(box):
+    # A box at a frame corner needs padding; it must repeat the edge, not add black
+    frame = np.full((480, 640, 3), 50, np.uint8)
+    photo = crop_to_icao(frame, box)
+    assert photo.min() == 50 and photo.max() == 50
+
+
+def test_padding_copies_the_nearest_edge_pixel():
+    frame = np.full((480, 640, 3), 50, np.uint8)
+    frame[:, 0] = 200  # Distinct left edge
+    photo = crop_to_icao(frame, (0, 200, 120, 120))
+    assert (photo[:, 0] == 200).all()
+
+
+def test_box_larger_than_frame():
+    frame = np.full((200, 200, 3), 50, np.uint8)
+    photo = crop_to_icao(frame, (-50, -50, 400, 400))
+    assert photo.shape == (ICAO_HEIGHT_PX, ICAO_WIDTH_PX, 3)
+    assert photo.min() == 50 and photo.max() == 50
+
+
+def test_box_outside_frame_is_rejected():
+    frame = np.full((200, 200, 3), 50, np.uint8)
+    with pytest.raises(ValueError):
+        crop_to_icao(frame, (1000, 1000, 50, 50))
+
+
+def test_face_box_in_crop_matches_the_crop():
+    # A bright face box drawn on the frame lands where face_box_in_crop says
+    frame = np.zeros((480, 640, 3), np.uint8)
+    box = (250, 150, 120, 120)
+    x, y, w, h = box
+    frame[y:y + h, x:x + w] = 255
+    fx, fy, fw, fh = face_box_in_crop(box)
+    photo = crop_to_icao(frame, box)
+    rows, cols = np.nonzero(photo[:, :, 0] > 128)
+    assert abs(cols.min() - fx) <= 2 and abs(cols.max() - (fx + fw)) <= 2
+    assert abs(rows.min() - fy) <= 2 and abs(rows.max() - (fy + fh)) <= 2
+
+
+def test_composite_keeps_the_subject_and_fills_the_background():
+    bgra = np.zeros((ICAO_HEIGHT_PX, ICAO_WIDTH_PX, 4), np.uint8)
+    bgra[:, :, :3] = (10, 20, 30)
+    bgra[300:700, 200:600, 3] = 255  # Opaque subject, transparent elsewhere
+    photo = composite_on_background(bgra, color=(240, 230, 220))
+    assert photo.shape == (ICAO_HEIGHT_PX, ICAO_WIDTH_PX, 3)
+    assert tuple(photo[500, 400]) == (10, 20, 30)
+    assert tuple(photo[50, 50]) == (240, 230, 220)
+    # Feathered edge lies between the two
+    edge = photo[500, 200].astype(int)
+    assert (edge > (10, 20, 30)).all() and (edge < (240, 230, 220)).all()
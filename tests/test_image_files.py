@@ -0,0 +1,23 @@
+import os
+
+from image_files import output_names
+
+
+def test_flat_directory_keeps_plain_names():
+    names, clashes = output_names([os.path.join('in', 'a.jpg'), os.path.join('in', 'b.jpg')])
+    assert names == {os.path.join('in', 'a.jpg'): 'a.png', os.path.join('in', 'b.jpg'): 'b.png'}
+    assert clashes == {}
+
+
+def test_same_name_in_subdirectories_keeps_the_subdirectory():
+    x, y = os.path.join('in', 'x', 'p.jpg'), os.path.join('in', 'y', 'p.jpg')
+    names, clashes = output_names([x, y])
+    assert names == {x: os.path.join('x', 'p.png'), y: os.path.join('y', 'p.png')}
+    assert clashes == {}
+
+
+def test_same_stem_in_one_directory_is_a_clash():
+    jpg, png = os.path.join('in', 'a.jpg'), os.path.join('in', 'a.png')
+    names, clashes = output_names([jpg, png])
+    assert names == {jpg: 'a.png'}
+    assert clashes == {png: jpg}
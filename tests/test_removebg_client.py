@@ -0,0 +1,96 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from removebg_client import RemoveBgClient, RemoveBgError
+
+
+class StubServer:
+    # remove.bg stand-in on 127.0.0.1. responses is a list of (status, headers,
+    # body) served in order, the last one repeating; every request is recorded
+    # with the client port it came from.
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive
+
+            def _serve(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                stub.requests.append((self.command, self.path, self.client_address[1]))
+                status, headers, body = stub.responses[min(len(stub.requests), len(stub.responses)) - 1]
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1.0"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+ACCOUNT = json.dumps({'data': {'attributes': {'credits': {'total': 50}}}}).encode()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(*responses):
+        servers.append(StubServer(responses))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_429_is_retried_after_retry_after(serve, monkeypatch):
+    server = serve((429, {'Retry-After': '2'}, b'{}'), (200, {'X-Credits-Charged': '1'}, b'PNG'))
+    client = RemoveBgClient(api_key='test', base_url=server.url)
+    sleeps = []
+    monkeypatch.setattr('removebg_client.time.sleep', sleeps.append)
+
+    assert client.remove_background(b'image') == b'PNG'
+    assert [r[0] for r in server.requests] == ['POST', 'POST']
+    assert sleeps == [2.0]
+    assert client.credits_charged == 1.0
+
+
+def test_connection_is_kept_alive(serve):
+    server = serve((200, {}, ACCOUNT))
+    client = RemoveBgClient(api_key='test', base_url=server.url)
+
+    for _ in range(3):
+        assert client.account() == {'credits': {'total': 50}}
+    ports = {port for _, _, port in server.requests}
+    assert len(server.requests) == 3
+    assert len(ports) == 1
+
+
+def test_403_raises_remove_bg_error(serve):
+    body = json.dumps({'errors': [{'title': 'API Key invalid'}]}).encode()
+    server = serve((403, {}, body))
+    client = RemoveBgClient(api_key='bad', base_url=server.url)
+
+    with pytest.raises(RemoveBgError) as error:
+        client.account()
+    assert error.value.status_code == 403
+    assert error.value.message == 'API Key invalid'
+    assert len(server.requests) == 1  # Not retried
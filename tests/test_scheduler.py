@@ -0,0 +1,31 @@
+import pytest
+
+from scheduler import FrameScheduler
+
+
+def detected_frames(detection_every, frames=12):
+    # Shown frames (1-based) that run detection, driven the way display_frame drives the scheduler
+    scheduler = FrameScheduler()
+    scheduler.detection_every = detection_every
+    detected = []
+    for seq in range(1, frames + 1):
+        scheduler.frame_shown(seq, now=seq / 30)
+        if scheduler.detection_due():
+            scheduler.record_detection(0.01)
+            detected.append(seq)
+    return detected
+
+
+@pytest.mark.parametrize('detection_every', [1, 2, 3])
+def test_detection_cadence(detection_every):
+    assert detected_frames(detection_every) == list(range(detection_every, 13, detection_every))
+
+
+def test_no_detection_until_due():
+    scheduler = FrameScheduler()
+    scheduler.detection_every = 3
+    scheduler.frame_shown(1, now=0.0)
+    scheduler.frame_shown(2, now=0.1)
+    assert not scheduler.detection_due()
+    scheduler.frame_shown(3, now=0.2)
+    assert scheduler.detection_due()